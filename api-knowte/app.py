@@ -1,5 +1,9 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
@@ -10,10 +14,19 @@ from routes.v1.endpoints.documentroutes import router as document_router
 from routes.v1.endpoints.flashcardroutes import router as flashcard_router
 from routes.v1.endpoints.quizroutes import router as quiz_router
 from routes.v1.endpoints.roomroutes import router as room_router
+from services.documentservice import MODEL_LOADING_RETRY_AFTER_SECONDS, get_document_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    if settings.donut_preload:
+        # Returns right away — Donut loads on a background thread
+        get_document_service().start_model_loading()
+    yield
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title=settings.app_name)
+    app = FastAPI(title=settings.app_name, lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -38,6 +51,21 @@ def create_app() -> FastAPI:
     def health() -> dict[str, str]:
         return {"status": "ok"}
 
+    @app.get("/ready", tags=["health"])
+    def ready() -> JSONResponse:
+        # 503 until the Donut model is loaded and warmed up.
+        # Also starts the load when DONUT_PRELOAD is off.
+        doc_service = get_document_service()
+        doc_service.start_model_loading()
+        readiness = doc_service.get_readiness()
+        if readiness["status"] == "ready":
+            return JSONResponse(readiness)
+        return JSONResponse(
+            readiness,
+            status_code=503,
+            headers={"Retry-After": str(MODEL_LOADING_RETRY_AFTER_SECONDS)},
+        )
+
     return app
 
 
@@ -0,0 +1,163 @@
+"""
+Donut DocVQA throughput as concurrent users grow, with questions of mixed length.
+
+Usage (from `api-knowte`):
+
+    python -m benchmarks.donut_batching --users 1,2,4,8
+    DONUT_MAX_NEW_TOKENS=16 python -m benchmarks.donut_batching --standin
+
+Every user asks the question set one question at a time on the same page,
+whose encoder states are already cached, so only the decoder runs (as for
+repeat questions on a page). Each user starts at a different question, so
+questions asked at the same moment tokenize to different lengths, as real
+ones do. Concurrent questions are micro-batched (`DONUT_BATCH_SIZE`,
+`DONUT_BATCH_WAIT_MS`). Two ways of running a batch are compared:
+- "grouped": one `generate` call per prompt length in the batch;
+- "padded":  shorter prompts left-padded into a single `generate` call.
+Both give the same answers; the report is questions/second per user count.
+
+`--standin` builds donut-base's architecture with random weights and a
+word-level stand-in tokenizer instead of downloading the model. Random
+weights rarely emit EOS, so every answer runs to DONUT_MAX_NEW_TOKENS.
+"""
+
+import argparse
+import re
+from threading import Thread
+from time import perf_counter
+from types import SimpleNamespace
+import zlib
+
+import numpy as np
+import torch
+from transformers import (
+    DonutImageProcessor,
+    DonutSwinConfig,
+    MBartConfig,
+    VisionEncoderDecoderConfig,
+    VisionEncoderDecoderModel,
+)
+
+import services.documentservice as documentservice
+from services.documentservice import DocumentService
+
+MODES = ("grouped", "padded")
+
+DEFAULT_QUESTIONS = [
+    "What is the title?",
+    "What is one important concept from this page?",
+    "What key definition appears on this page?",
+    "What is the date?",
+    "What important fact should a student remember from this page?",
+    "Who is the author?",
+    "What is one likely exam point from this page?",
+    "What does the table show?",
+]
+
+
+class _StandinTokenizer:
+    # One id per word or tag — enough to give prompts realistic, mixed lengths
+    pad_token_id, eos_token_id, unk_token_id = 1, 2, 3
+    pad_token, eos_token = "<pad>", "</s>"
+
+    def __init__(self, vocab_size: int) -> None:
+        self._vocab_size = vocab_size
+
+    def __call__(self, text: str, add_special_tokens: bool = False, return_tensors: str = "pt"):
+        pieces = re.findall(r"<[^>]+>|\w+|[^\w\s]", text)
+        ids = [4 + zlib.crc32(piece.encode()) % (self._vocab_size - 4) for piece in pieces]
+        return SimpleNamespace(input_ids=torch.tensor([ids]))
+
+
+def _use_standin_model() -> None:
+    # donut-base-finetuned-docvqa's architecture with random weights
+    encoder = DonutSwinConfig(
+        image_size=[2560, 1920],
+        patch_size=4,
+        embed_dim=128,
+        depths=[2, 2, 14, 2],
+        num_heads=[4, 8, 16, 32],
+        window_size=10,
+    )
+    decoder = MBartConfig(
+        vocab_size=57532,
+        d_model=1024,
+        decoder_layers=4,
+        decoder_attention_heads=16,
+        decoder_ffn_dim=4096,
+        max_position_embeddings=768,
+        is_decoder=True,
+        add_cross_attention=True,
+        scale_embedding=True,
+        add_final_layer_norm=True,
+    )
+    config = VisionEncoderDecoderConfig.from_encoder_decoder_configs(encoder, decoder)
+    config.decoder_start_token_id = 0
+    config.pad_token_id = 1
+    config.eos_token_id = 2
+    processor = SimpleNamespace(
+        image_processor=DonutImageProcessor(size={"height": 2560, "width": 1920}, do_align_long_axis=False),
+        tokenizer=_StandinTokenizer(decoder.vocab_size),
+        batch_decode=lambda sequences: ["" for _ in sequences],
+        token2json=lambda text: {"answer": text},
+    )
+
+    documentservice.DonutProcessor = SimpleNamespace(from_pretrained=lambda name: processor)
+    documentservice.VisionEncoderDecoderModel = SimpleNamespace(
+        from_pretrained=lambda name: VisionEncoderDecoderModel(config).eval()
+    )
+
+
+def _throughput(service: DocumentService, encoder_states: torch.Tensor, questions: list[str], users: int) -> float:
+    def ask_all(first: int) -> None:
+        for question in questions[first:] + questions[:first]:
+            service._run_donut(encoder_states, question)
+
+    threads = [Thread(target=ask_all, args=(user % len(questions),)) for user in range(users)]
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return users * len(questions) / (perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1,2,4,8", help="Comma-separated concurrent user counts.")
+    parser.add_argument("--standin", action="store_true", help="Random-weight donut-base instead of the real model.")
+    args = parser.parse_args()
+    user_counts = [int(users) for users in args.users.split(",")]
+
+    if args.standin:
+        _use_standin_model()
+    service = DocumentService()
+    if not service.wait_until_ready():
+        raise SystemExit(service.get_readiness().get("error", "Model failed to load."))
+    if not service._backend.pads_prompts:
+        raise SystemExit("This model's decoder cannot run left-padded prompts.")
+
+    tokenizer = service._processor.tokenizer
+    lengths = sorted({tokenizer(question).input_ids.shape[-1] for question in DEFAULT_QUESTIONS})
+    blank_page = np.full((*service._input_size, 3), 255, dtype=np.uint8)
+    encoder_states = service._backend.encode(service._preprocessor([blank_page]))
+    # Warm up the decoder once so the first mode does not pay for it
+    service._run_donut(encoder_states, DEFAULT_QUESTIONS[0])
+
+    print(
+        f"{len(DEFAULT_QUESTIONS)} questions per user (token lengths {lengths}), "
+        f"DONUT_BATCH_SIZE={documentservice.settings.donut_batch_size}, "
+        f"DONUT_MAX_NEW_TOKENS={documentservice.settings.donut_max_new_tokens}"
+    )
+    print(f"{'users':>5} | " + " | ".join(f"{mode + ' q/s':>12}" for mode in MODES))
+    for users in user_counts:
+        rates = []
+        for mode in MODES:
+            service._backend.pads_prompts = mode == "padded"
+            rates.append(_throughput(service, encoder_states, DEFAULT_QUESTIONS, users))
+        print(f"{users:>5} | " + " | ".join(f"{rate:>12.2f}" for rate in rates))
+    service._backend.pads_prompts = True
+
+
+if __name__ == "__main__":
+    main()
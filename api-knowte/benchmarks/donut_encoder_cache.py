@@ -0,0 +1,85 @@
+"""
+Time per DocVQA question with and without the per-page encoder cache.
+
+Usage (from `api-knowte`):
+
+    python -m benchmarks.donut_encoder_cache path/to/file.pdf --page 1 --repeat 5
+
+"Before" clears the encoder cache ahead of every question, so each call pays
+for preprocessing + Swin encoder + decoder like the old `_run_donut` did.
+"After" encodes the page once and then only decodes. Both runs call the model
+directly, so the per-document answer cache does not hide inference time.
+"""
+
+import argparse
+from pathlib import Path
+from statistics import mean
+from time import perf_counter
+
+from fastapi import UploadFile
+
+from services.documentservice import DocumentService
+
+DEFAULT_QUESTIONS = [
+    "What is the title?",
+    "What is one important concept from this page?",
+    "What key definition appears on this page?",
+    "What important fact should a student remember from this page?",
+    "What is one likely exam point from this page?",
+]
+
+
+def _clear_encoder_states(service: DocumentService) -> None:
+    service._memory.discard_where(lambda key: key[0] == "encoder_states")
+
+
+def _time_questions(
+    service: DocumentService,
+    content_hash: str,
+    page: int,
+    questions: list[str],
+    clear_cache: bool,
+) -> list[float]:
+    timings: list[float] = []
+    for question in questions:
+        if clear_cache:
+            _clear_encoder_states(service)
+        started = perf_counter()
+        service._run_donut(service._encode_page(content_hash, page), question)
+        timings.append(perf_counter() - started)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", type=Path)
+    parser.add_argument("--page", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="How many times to ask the question set.")
+    args = parser.parse_args()
+
+    service = DocumentService()
+    if not service.wait_until_ready():
+        raise SystemExit(service.get_readiness().get("error", "Model failed to load."))
+    with args.pdf.open("rb") as handle:
+        upload = service.upload_document(UploadFile(handle, filename=args.pdf.name))
+
+    questions = DEFAULT_QUESTIONS * max(1, args.repeat)
+    # Render the page once so both runs start from the same page cache state
+    content = service._get_ready_content(upload.document_id)
+    service._get_page_pixmap(content.content_hash, args.page)
+
+    before = _time_questions(service, content.content_hash, args.page, questions, clear_cache=True)
+    _clear_encoder_states(service)
+    after = _time_questions(service, content.content_hash, args.page, questions, clear_cache=False)
+    service._delete_document(upload.document_id)
+
+    print(f"document: {args.pdf.name} (page {args.page}, {len(questions)} questions)")
+    print(f"before (encode every question): {mean(before) * 1000:8.1f} ms/question")
+    print(f"after  (cached encoder states): {mean(after) * 1000:8.1f} ms/question")
+    print(f"after, first question (cold):   {after[0] * 1000:8.1f} ms")
+    if len(after) > 1:
+        print(f"after, warm questions only:     {mean(after[1:]) * 1000:8.1f} ms/question")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Compare Donut CPU inference modes (DONUT_INFERENCE_MODE) on latency and answers.
+
+Usage (from `api-knowte`):
+
+    python -m benchmarks.donut_inference_modes notes.pdf slides.pdf --pages 2 --modes fp32,int8,bf16
+
+Every mode answers the same questions on the same pages, with the encoder
+cache cleared per page so each page pays for one encode. Answers are compared
+against the first mode listed (the reference, normally fp32): "match" is the
+share of answers identical to the reference after whitespace/case folding.
+Pass `--questions file.txt` (one question per line) to use your own set.
+"""
+
+import argparse
+from pathlib import Path
+from statistics import mean, median
+from time import perf_counter
+
+from fastapi import UploadFile
+
+from core.inference_backend import INFERENCE_MODES, DonutInferenceBackend
+from services.documentservice import DocumentService, _load_donut
+
+DEFAULT_QUESTIONS = [
+    "What is the title?",
+    "What is one important concept from this page?",
+    "What key definition appears on this page?",
+    "What is the date?",
+]
+
+
+def _normalize(answer: str) -> str:
+    return " ".join(answer.lower().split())
+
+
+def _run_mode(
+    service: DocumentService,
+    pages: list[tuple[str, int]],
+    questions: list[str],
+) -> tuple[list[float], list[float], list[str]]:
+    encode_timings: list[float] = []
+    question_timings: list[float] = []
+    answers: list[str] = []
+    for content_hash, page in pages:
+        service._memory.discard_where(lambda key: key[0] == "encoder_states")
+        started = perf_counter()
+        encoder_states = service._encode_page(content_hash, page)
+        encode_timings.append(perf_counter() - started)
+        for question in questions:
+            started = perf_counter()
+            answer, _ = service._run_donut(encoder_states, question)
+            question_timings.append(perf_counter() - started)
+            answers.append(answer)
+    return encode_timings, question_timings, answers
+
+
+def _p95(values: list[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", type=Path, nargs="+")
+    parser.add_argument("--pages", type=int, default=1, help="First N pages of every PDF.")
+    parser.add_argument("--modes", default="fp32,int8,bf16", help=f"Comma-separated, from: {', '.join(INFERENCE_MODES)}.")
+    parser.add_argument("--questions", type=Path, help="Text file with one question per line.")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions is not None:
+        questions = [line.strip() for line in args.questions.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+    service = DocumentService()
+    if not service.wait_until_ready():
+        raise SystemExit(service.get_readiness().get("error", "Model failed to load."))
+    # Every mode starts from fp32 weights — with DONUT_INFERENCE_MODE=int8 the
+    # service quantized its own model in place, so load a separate one
+    model = service._backend.model
+    if service._backend.mode == "int8":
+        _, model = _load_donut()
+
+    document_ids: list[str] = []
+    pages: list[tuple[str, int]] = []
+    for pdf in args.pdfs:
+        with pdf.open("rb") as handle:
+            upload = service.upload_document(UploadFile(handle, filename=pdf.name))
+        document_ids.append(upload.document_id)
+        content = service._get_ready_content(upload.document_id)
+        for page in range(1, min(args.pages, content.page_count) + 1):
+            service._get_page_pixmap(content.content_hash, page)  # render outside the timings
+            pages.append((content.content_hash, page))
+
+    reference: list[str] | None = None
+    print(f"{len(args.pdfs)} PDF(s), {len(pages)} page(s), {len(questions)} question(s) per page")
+    print(f"{'mode':<12}{'encode ms':>11}{'answer p50':>12}{'answer p95':>12}{'match':>8}")
+    for requested_mode in args.modes.split(","):
+        service._backend = DonutInferenceBackend(model, requested_mode.strip())
+        encode_timings, question_timings, answers = _run_mode(service, pages, questions)
+
+        normalized = [_normalize(answer) for answer in answers]
+        if reference is None:
+            reference = normalized
+        match = sum(a == b for a, b in zip(normalized, reference)) / max(1, len(reference))
+
+        label = service._backend.mode
+        if label != service._backend.requested_mode:
+            label = f"{service._backend.requested_mode}>{label}"
+        print(
+            f"{label:<12}"
+            f"{mean(encode_timings) * 1000:>11.1f}"
+            f"{median(question_timings) * 1000:>12.1f}"
+            f"{_p95(question_timings) * 1000:>12.1f}"
+            f"{match:>8.0%}"
+        )
+
+    for document_id in document_ids:
+        service._delete_document(document_id)
+
+
+if __name__ == "__main__":
+    main()
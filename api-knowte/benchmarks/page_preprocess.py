@@ -0,0 +1,73 @@
+"""
+Check the pixmap -> pixel_values fast path against DonutProcessor.
+
+Usage (from `api-knowte`):
+
+    python -m benchmarks.page_preprocess notes.pdf slides.pdf --pages 3
+
+Renders each page the way the API does, then builds `pixel_values` twice:
+with `DonutProcessor` from a PIL image (the old path) and with
+`DonutPagePreprocessor` straight from the pixmap buffer. Prints the largest
+and mean absolute difference per page and fails if any page is off by more
+than `PREPROCESS_TOLERANCE`.
+"""
+
+import argparse
+import sys
+from statistics import median
+from time import perf_counter
+
+import fitz
+from PIL import Image
+from transformers import DonutProcessor
+
+from config import settings
+from core.page_preprocess import PREPROCESS_TOLERANCE, DonutPagePreprocessor, pixmap_array
+from core.page_render import RenderProfile
+from services.documentservice import MODEL_NAME
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+", help="PDF files to sample pages from")
+    parser.add_argument("--pages", type=int, default=3, help="pages per PDF")
+    args = parser.parse_args()
+
+    processor = DonutProcessor.from_pretrained(MODEL_NAME)
+    preprocessor = DonutPagePreprocessor.from_image_processor(processor.image_processor)
+    render_profile = RenderProfile(settings.document_render_profile)
+
+    processor_ms: list[float] = []
+    fast_ms: list[float] = []
+    worst = 0.0
+    for path in args.pdfs:
+        with fitz.open(path) as pdf:
+            for index in range(min(args.pages, pdf.page_count)):
+                zoom = render_profile.zoom(pdf[index], preprocessor.height, preprocessor.width)
+                pixmap = pdf[index].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+
+                started = perf_counter()
+                image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+                expected = processor(image, return_tensors="pt").pixel_values
+                processor_ms.append((perf_counter() - started) * 1000)
+
+                started = perf_counter()
+                actual = preprocessor([pixmap_array(pixmap)])
+                fast_ms.append((perf_counter() - started) * 1000)
+
+                difference = (actual - expected).abs()
+                worst = max(worst, float(difference.max()))
+                print(
+                    f"{path} page {index + 1}: max diff {float(difference.max()):.5f}, "
+                    f"mean diff {float(difference.mean()):.2e}"
+                )
+
+    print(f"DonutProcessor:        median {median(processor_ms):.1f} ms/page")
+    print(f"DonutPagePreprocessor: median {median(fast_ms):.1f} ms/page")
+    print(f"max diff {worst:.5f} (tolerance {PREPROCESS_TOLERANCE:.5f})")
+    if worst > PREPROCESS_TOLERANCE:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Per-worker memory with and without preload-before-fork (prefork_server.py).
+
+Usage (from `api-knowte`):
+
+    python -m benchmarks.worker_memory --workers 4
+    python -m benchmarks.worker_memory --workers 4 --standin --warmup
+
+For each mode, forks `--workers` processes that end up holding Donut the
+way API workers do:
+- "per-worker": each worker loads Donut itself (plain `uvicorn --workers`);
+- "preload":    Donut is loaded once in the master before the fork.
+Then it reads /proc/<pid>/smaps_rollup of every worker. RSS counts shared
+pages in full in every process; PSS splits them between the processes
+sharing them, so the PSS total (workers + master) is the real RAM used.
+USS is what a worker holds alone (freed if it exits).
+
+`--standin` builds donut-base's architecture (~200M parameters) with random
+weights instead of downloading the model — same tensors, same memory.
+`--warmup` runs one inference per worker first (adds private activation memory).
+"""
+
+import argparse
+import gc
+import json
+import os
+import signal
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from transformers import (
+    DonutImageProcessor,
+    DonutSwinConfig,
+    MBartConfig,
+    VisionEncoderDecoderConfig,
+    VisionEncoderDecoderModel,
+)
+from transformers.modeling_outputs import BaseModelOutput
+
+import services.documentservice as documentservice
+from core.page_preprocess import DonutPagePreprocessor
+
+MODES = ("per-worker", "preload")
+
+
+def _use_standin_model() -> None:
+    # donut-base-finetuned-docvqa's architecture with random weights
+    encoder = DonutSwinConfig(
+        image_size=[2560, 1920],
+        patch_size=4,
+        embed_dim=128,
+        depths=[2, 2, 14, 2],
+        num_heads=[4, 8, 16, 32],
+        window_size=10,
+    )
+    decoder = MBartConfig(
+        vocab_size=57532,
+        d_model=1024,
+        decoder_layers=4,
+        decoder_attention_heads=16,
+        decoder_ffn_dim=4096,
+        max_position_embeddings=768,
+        is_decoder=True,
+        add_cross_attention=True,
+        scale_embedding=True,
+        add_final_layer_norm=True,
+    )
+    config = VisionEncoderDecoderConfig.from_encoder_decoder_configs(encoder, decoder)
+    config.decoder_start_token_id = 0
+    config.pad_token_id = 1
+    config.eos_token_id = 2
+    image_processor = DonutImageProcessor(size={"height": 2560, "width": 1920}, do_align_long_axis=False)
+
+    documentservice.DonutProcessor = SimpleNamespace(
+        from_pretrained=lambda name: SimpleNamespace(image_processor=image_processor)
+    )
+    documentservice.VisionEncoderDecoderModel = SimpleNamespace(
+        from_pretrained=lambda name: VisionEncoderDecoderModel(config).eval()
+    )
+
+
+def _smaps_rollup(pid: int) -> dict[str, int]:
+    # Values in kB
+    fields: dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def _worker(write_fd: int, warmup: bool) -> None:
+    # Forked child: hold Donut like an API worker would, report, then wait to be killed
+    if documentservice._preloaded_donut is not None:
+        processor, model, backend = documentservice._preloaded_donut
+    else:
+        processor, model = documentservice._load_donut()
+        backend = None
+    backend = backend or documentservice._build_backend(model)
+
+    if warmup:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // 2))
+        preprocessor = DonutPagePreprocessor.from_image_processor(processor.image_processor)
+        blank_page = np.full((preprocessor.height, preprocessor.width, 3), 255, dtype=np.uint8)
+        encoder_states = backend.encode(preprocessor([blank_page]))
+        backend.generate(
+            encoder_outputs=BaseModelOutput(last_hidden_state=encoder_states),
+            decoder_input_ids=torch.tensor([[model.config.decoder_start_token_id]]),
+            max_new_tokens=4,
+        )
+
+    os.write(write_fd, b"1")
+    os.close(write_fd)
+    while True:
+        signal.pause()
+
+
+def _run_mode(mode: str, workers: int, warmup: bool) -> dict:
+    if mode == "preload":
+        documentservice.preload_donut_model()
+        gc.freeze()
+
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _worker(write_fd, warmup)
+            os._exit(0)
+        pids.append(pid)
+    os.close(write_fd)
+
+    ready = 0
+    while ready < workers:
+        chunk = os.read(read_fd, workers)
+        if not chunk:
+            raise RuntimeError("A worker exited before it was ready.")
+        ready += len(chunk)
+
+    memory = [_smaps_rollup(pid) for pid in pids]
+    master = _smaps_rollup(os.getpid())
+    for pid in pids:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    return {"mode": mode, "workers": memory, "master": master}
+
+
+def _print_report(result: dict) -> None:
+    workers = result["workers"]
+    count = len(workers)
+    mib = lambda kb: kb / 1024
+    print(f"{result['mode']:>10}: per worker RSS {mib(sum(w['rss'] for w in workers) / count):7.0f} MiB, "
+          f"PSS {mib(sum(w['pss'] for w in workers) / count):7.0f} MiB, "
+          f"USS {mib(sum(w['uss'] for w in workers) / count):7.0f} MiB | "
+          f"total PSS incl. master {mib(sum(w['pss'] for w in workers) + result['master']['pss']):7.0f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated: per-worker,preload")
+    parser.add_argument("--standin", action="store_true", help="random-weight donut-base instead of downloading")
+    parser.add_argument("--warmup", action="store_true", help="one inference per worker before measuring")
+    parser.add_argument("--run", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.standin:
+        _use_standin_model()
+
+    if args.run:
+        # One mode per fresh interpreter, so modes do not share pages
+        print(json.dumps(_run_mode(args.run, args.workers, args.warmup)))
+        return
+
+    for mode in args.modes.split(","):
+        command = [sys.executable, "-m", "benchmarks.worker_memory", "--run", mode, "--workers", str(args.workers)]
+        command += ["--standin"] if args.standin else []
+        command += ["--warmup"] if args.warmup else []
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        _print_report(json.loads(output.strip().splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,23 @@ def _parse_int(value: str | None, default: int) -> int:
         return default
 
 
+def _parse_float(value: str | None, default: float) -> float:
+    if value is None:
+        return default
+
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def _parse_bool(value: str | None, default: bool) -> bool:
+    if value is None:
+        return default
+
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
 def _parse_csv(value: str | None) -> list[str]:
     if value is None:
         return ["*"]
@@ -57,10 +74,29 @@ class Settings:
     ollama_base_url: str
     ollama_model: str
     qwen_model: str
+    document_memory_budget_bytes: int
+    donut_batch_size: int
+    donut_batch_wait_ms: int
+    document_ingest_workers: int
+    document_store_path: str
+    donut_preload: bool
+    donut_warmup: bool
+    donut_inference_mode: str
+    donut_inference_slots: int
+    donut_threads_per_slot: int
+    donut_max_queued: int
+    donut_max_new_tokens: int
+    document_ask_top_pages: int
+    extractive_qa_threshold: float
+    document_page_format: str
+    document_decoded_pages_bytes: int
+    document_render_profile: str
+    donut_server_socket: str | None
 
 
 def load_settings() -> Settings:
     _load_env_file()
+    donut_inference_slots = max(1, _parse_int(os.getenv("DONUT_INFERENCE_SLOTS"), 1))
     return Settings(
         app_name=os.getenv("APP_NAME", "Knowte API"),
         app_env=os.getenv("APP_ENV", "development"),
@@ -79,6 +115,33 @@ def load_settings() -> Settings:
         ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
         ollama_model=os.getenv("OLLAMA_MODEL", "phi3"),
         qwen_model=os.getenv("QWEN_MODEL", "qwen3.5:4b"),
+        document_memory_budget_bytes=_parse_int(
+            os.getenv("DOCUMENT_MEMORY_BUDGET_BYTES"), 512 * 1024 * 1024
+        ),
+        donut_batch_size=_parse_int(os.getenv("DONUT_BATCH_SIZE"), 4),
+        donut_batch_wait_ms=_parse_int(os.getenv("DONUT_BATCH_WAIT_MS"), 10),
+        document_ingest_workers=_parse_int(
+            os.getenv("DOCUMENT_INGEST_WORKERS"), os.cpu_count() or 1
+        ),
+        document_store_path=os.getenv("DOCUMENT_STORE_PATH", "data/documents.sqlite3"),
+        donut_preload=_parse_bool(os.getenv("DONUT_PRELOAD"), True),
+        donut_warmup=_parse_bool(os.getenv("DONUT_WARMUP"), True),
+        donut_inference_mode=os.getenv("DONUT_INFERENCE_MODE", "fp32").strip().lower(),
+        donut_inference_slots=donut_inference_slots,
+        # Default: split the cores evenly between slots
+        donut_threads_per_slot=_parse_int(
+            os.getenv("DONUT_THREADS_PER_SLOT"), max(1, (os.cpu_count() or 1) // donut_inference_slots)
+        ),
+        donut_max_queued=_parse_int(os.getenv("DONUT_MAX_QUEUED"), 32),
+        donut_max_new_tokens=_parse_int(os.getenv("DONUT_MAX_NEW_TOKENS"), 128),
+        document_ask_top_pages=_parse_int(os.getenv("DOCUMENT_ASK_TOP_PAGES"), 2),
+        extractive_qa_threshold=_parse_float(os.getenv("EXTRACTIVE_QA_THRESHOLD"), 0.6),
+        document_page_format=os.getenv("DOCUMENT_PAGE_FORMAT", "png").strip().lower(),
+        document_decoded_pages_bytes=_parse_int(
+            os.getenv("DOCUMENT_DECODED_PAGES_BYTES"), 64 * 1024 * 1024
+        ),
+        document_render_profile=os.getenv("DOCUMENT_RENDER_PROFILE", "adaptive").strip().lower(),
+        donut_server_socket=os.getenv("DONUT_SERVER_SOCKET") or None,
     )
 
 
@@ -0,0 +1,426 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import sqlite3
+from threading import local
+from time import time
+
+from models.documentmodel import Document, DocumentContent
+
+# Columns added after a table was first created: (table, column, definition)
+ADDED_COLUMNS = (("contents", "file_name", "TEXT"),)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash);
+CREATE INDEX IF NOT EXISTS idx_documents_expires_at ON documents (expires_at);
+
+CREATE TABLE IF NOT EXISTS contents (
+    content_hash TEXT PRIMARY KEY,
+    page_count INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    pages_processed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    extracted_text TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    file_name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS page_texts (
+    content_hash TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (content_hash, page)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS page_indexes (
+    content_hash TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sentence_indexes (
+    content_hash TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS template_answers (
+    content_hash TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    template TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    PRIMARY KEY (content_hash, page, template)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS page_renders (
+    content_hash TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (content_hash, page)
+);
+"""
+
+
+class DocumentStore:
+    """
+    SQLite (WAL mode) store for document metadata, per-page text and page renders.
+
+    Shared by every API worker process on the host and kept across restarts;
+    the PDFs themselves are files next to the database (`contents/`). Each thread gets its own
+    connection, and multi-statement updates run in `BEGIN IMMEDIATE`
+    transactions so concurrent workers serialize on writes.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self._db_path = db_path
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = local()
+        self._connection().executescript(SCHEMA)
+        self._add_missing_columns()
+
+    def add_document(self, document: Document, ttl_seconds: int) -> bool:
+        """
+        Insert a document and take a reference on its content.
+        Returns False (and stores nothing) if the content row no longer exists.
+        """
+        created_at = _to_epoch(document.created_at)
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE contents SET ref_count = ref_count + 1 WHERE content_hash = ?",
+                (document.content_hash,),
+            ).rowcount
+            if not updated:
+                return False
+            conn.execute(
+                "INSERT INTO documents (id, filename, content_hash, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (document.id, document.filename, document.content_hash, created_at, created_at + ttl_seconds),
+            )
+        return True
+
+    def get_document(self, document_id: str) -> Document | None:
+        row = self._connection().execute(
+            "SELECT id, filename, content_hash, created_at FROM documents WHERE id = ? AND expires_at > ?",
+            (document_id, time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return Document(
+            id=row["id"],
+            filename=row["filename"],
+            content_hash=row["content_hash"],
+            created_at=datetime.utcfromtimestamp(row["created_at"]),
+        )
+
+    def delete_document(self, document_id: str) -> tuple[str, str] | None:
+        """
+        Delete a document and release its content reference.
+        Returns (content hash, PDF file name) if that was the last reference
+        and the content was dropped too (caller removes the PDF and in-memory caches).
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "DELETE FROM documents WHERE id = ? RETURNING content_hash",
+                (document_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            return self._release_content(conn, row["content_hash"])
+
+    def delete_expired(self) -> list[tuple[str, str]]:
+        """Delete expired documents. Returns (content hash, PDF file name) of the dropped contents."""
+        dropped: list[tuple[str, str]] = []
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "DELETE FROM documents WHERE expires_at <= ? RETURNING content_hash",
+                (time(),),
+            ).fetchall()
+            for row in rows:
+                released = self._release_content(conn, row["content_hash"])
+                if released is not None:
+                    dropped.append(released)
+        return dropped
+
+    def next_expiry(self) -> float | None:
+        """Epoch time the next document expires at (index lookup), or None if empty."""
+        row = self._connection().execute("SELECT MIN(expires_at) AS expires_at FROM documents").fetchone()
+        return row["expires_at"]
+
+    def create_content(self, content: DocumentContent) -> tuple[bool, str | None]:
+        """
+        Register a newly uploaded PDF (`content.file_name`) as "processing".
+        A previously failed row is reset so ingestion can run again.
+        Returns (created, file name of the failed attempt it replaced);
+        created is False if another upload already owns the ingest.
+        """
+        now = time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT status, file_name FROM contents WHERE content_hash = ?",
+                (content.content_hash,),
+            ).fetchone()
+            if row is not None and row["status"] != "failed":
+                return False, None
+
+            conn.execute("DELETE FROM page_texts WHERE content_hash = ?", (content.content_hash,))
+            conn.execute("DELETE FROM page_indexes WHERE content_hash = ?", (content.content_hash,))
+            conn.execute("DELETE FROM sentence_indexes WHERE content_hash = ?", (content.content_hash,))
+            conn.execute("DELETE FROM template_answers WHERE content_hash = ?", (content.content_hash,))
+            conn.execute(
+                """
+                INSERT INTO contents (content_hash, page_count, status, created_at, updated_at, file_name)
+                VALUES (?, ?, 'processing', ?, ?, ?)
+                ON CONFLICT (content_hash) DO UPDATE SET
+                    page_count = excluded.page_count,
+                    status = 'processing',
+                    pages_processed = 0,
+                    error = NULL,
+                    extracted_text = '',
+                    updated_at = excluded.updated_at,
+                    file_name = excluded.file_name
+                """,
+                (content.content_hash, content.page_count, now, now, content.file_name),
+            )
+        if row is None:
+            return True, None
+        return True, _file_name(content.content_hash, row["file_name"])
+
+    def get_content(self, content_hash: str) -> DocumentContent | None:
+        """Content metadata and extracted text — page texts are loaded separately."""
+        row = self._connection().execute(
+            """
+            SELECT content_hash, page_count, status, pages_processed, error, ref_count,
+                   extracted_text, created_at, updated_at, file_name
+            FROM contents WHERE content_hash = ?
+            """,
+            (content_hash,),
+        ).fetchone()
+        if row is None:
+            return None
+        return DocumentContent(
+            content_hash=row["content_hash"],
+            page_count=row["page_count"],
+            extracted_text=row["extracted_text"],
+            status=row["status"],
+            pages_processed=row["pages_processed"],
+            error=row["error"],
+            ref_count=row["ref_count"],
+            created_at=datetime.utcfromtimestamp(row["created_at"]),
+            updated_at=datetime.utcfromtimestamp(row["updated_at"]),
+            file_name=_file_name(row["content_hash"], row["file_name"]),
+        )
+
+    def get_content_file_name(self, content_hash: str) -> str | None:
+        """PDF file of the content's current ingest — cheap check that a cached content is still current."""
+        row = self._connection().execute(
+            "SELECT file_name FROM contents WHERE content_hash = ?",
+            (content_hash,),
+        ).fetchone()
+        return _file_name(content_hash, row["file_name"]) if row is not None else None
+
+    def save_page_texts(
+        self,
+        content_hash: str,
+        file_name: str,
+        start: int,
+        page_texts: list[str],
+    ) -> tuple[int, int]:
+        """
+        Store one shard of page texts (`start` is the 0-based first page) for
+        the ingest of `file_name`. Returns (pages_processed, page_count) after
+        the update, or (0, -1) without writing anything if that ingest is no
+        longer running (content dropped, failed, or re-uploaded since).
+        """
+        with self._transaction() as conn:
+            if not self._ingest_running(conn, content_hash, file_name):
+                return 0, -1
+            conn.executemany(
+                "INSERT OR REPLACE INTO page_texts (content_hash, page, text) VALUES (?, ?, ?)",
+                [(content_hash, start + offset + 1, text) for offset, text in enumerate(page_texts)],
+            )
+            row = conn.execute(
+                """
+                UPDATE contents SET pages_processed = pages_processed + ?, updated_at = ?
+                WHERE content_hash = ?
+                RETURNING pages_processed, page_count
+                """,
+                (len(page_texts), time(), content_hash),
+            ).fetchone()
+        return row["pages_processed"], row["page_count"]
+
+    def touch_contents(self, content_hashes: list[str]) -> None:
+        """Mark ingests as still running (`updated_at`) — called by the worker that owns them."""
+        now = time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE contents SET updated_at = ? WHERE content_hash = ? AND status = 'processing'",
+                [(now, content_hash) for content_hash in content_hashes],
+            )
+
+    def get_page_texts(self, content_hash: str) -> list[str]:
+        """Extracted text per page, index 0 = page 1."""
+        rows = self._connection().execute(
+            "SELECT text FROM page_texts WHERE content_hash = ? ORDER BY page",
+            (content_hash,),
+        ).fetchall()
+        return [row["text"] for row in rows]
+
+    def mark_ready(
+        self,
+        content_hash: str,
+        file_name: str,
+        extracted_text: str,
+        page_index: str,
+        sentence_index: str,
+    ) -> bool:
+        """
+        Finish the ingest of `file_name`: store the merged text and the
+        serialized `PageIndex` / `SentenceIndex`. Returns False (and writes
+        nothing) if that ingest is no longer running.
+        """
+        with self._transaction() as conn:
+            if not self._ingest_running(conn, content_hash, file_name):
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO page_indexes (content_hash, data) VALUES (?, ?)",
+                (content_hash, page_index),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sentence_indexes (content_hash, data) VALUES (?, ?)",
+                (content_hash, sentence_index),
+            )
+            conn.execute(
+                "UPDATE contents SET status = 'ready', extracted_text = ?, updated_at = ? WHERE content_hash = ?",
+                (extracted_text, time(), content_hash),
+            )
+        return True
+
+    def get_page_index(self, content_hash: str) -> str | None:
+        row = self._connection().execute(
+            "SELECT data FROM page_indexes WHERE content_hash = ?",
+            (content_hash,),
+        ).fetchone()
+        return row["data"] if row is not None else None
+
+    def get_sentence_index(self, content_hash: str) -> str | None:
+        row = self._connection().execute(
+            "SELECT data FROM sentence_indexes WHERE content_hash = ?",
+            (content_hash,),
+        ).fetchone()
+        return row["data"] if row is not None else None
+
+    def get_template_answers(self, content_hash: str) -> dict[tuple[int, str], str]:
+        """Cached answers to the prompt-independent flashcard templates, by (page, template)."""
+        rows = self._connection().execute(
+            "SELECT page, template, answer FROM template_answers WHERE content_hash = ?",
+            (content_hash,),
+        ).fetchall()
+        return {(row["page"], row["template"]): row["answer"] for row in rows}
+
+    def put_template_answer(self, content_hash: str, page: int, template: str, answer: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO template_answers (content_hash, page, template, answer) VALUES (?, ?, ?, ?)",
+                (content_hash, page, template, answer),
+            )
+
+    def mark_failed(self, content_hash: str, error: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                UPDATE contents SET status = 'failed', error = ?, updated_at = ?
+                WHERE content_hash = ? AND status = 'processing'
+                """,
+                (error, time(), content_hash),
+            )
+
+    def put_page_render(self, content_hash: str, page: int, data: bytes) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_renders (content_hash, page, data, created_at) VALUES (?, ?, ?, ?)",
+                (content_hash, page, data, time()),
+            )
+
+    def get_page_render(self, content_hash: str, page: int) -> bytes | None:
+        row = self._connection().execute(
+            "SELECT data FROM page_renders WHERE content_hash = ? AND page = ?",
+            (content_hash, page),
+        ).fetchone()
+        return row["data"] if row is not None else None
+
+    def _release_content(self, conn: sqlite3.Connection, content_hash: str) -> tuple[str, str] | None:
+        row = conn.execute(
+            "UPDATE contents SET ref_count = ref_count - 1 WHERE content_hash = ? RETURNING ref_count, file_name",
+            (content_hash,),
+        ).fetchone()
+        if row is None or row["ref_count"] > 0:
+            return None
+
+        conn.execute("DELETE FROM contents WHERE content_hash = ?", (content_hash,))
+        conn.execute("DELETE FROM page_texts WHERE content_hash = ?", (content_hash,))
+        conn.execute("DELETE FROM page_indexes WHERE content_hash = ?", (content_hash,))
+        conn.execute("DELETE FROM sentence_indexes WHERE content_hash = ?", (content_hash,))
+        conn.execute("DELETE FROM template_answers WHERE content_hash = ?", (content_hash,))
+        conn.execute("DELETE FROM page_renders WHERE content_hash = ?", (content_hash,))
+        return content_hash, _file_name(content_hash, row["file_name"])
+
+    def _ingest_running(self, conn: sqlite3.Connection, content_hash: str, file_name: str) -> bool:
+        # Late shards of a dropped/failed/replaced ingest must not leave rows behind
+        row = conn.execute(
+            "SELECT status, file_name FROM contents WHERE content_hash = ?",
+            (content_hash,),
+        ).fetchone()
+        return (
+            row is not None
+            and row["status"] == "processing"
+            and _file_name(content_hash, row["file_name"]) == file_name
+        )
+
+    def _add_missing_columns(self) -> None:
+        # Databases created by an older version — every worker checks, the first one adds
+        with self._transaction() as conn:
+            for table, column, definition in ADDED_COLUMNS:
+                columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None — autocommit; writes use explicit transactions
+            conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _file_name(content_hash: str, file_name: str | None) -> str:
+    # Rows from before per-ingest file names used the bare hash
+    return file_name or f"{content_hash}.pdf"
+
+
+def _to_epoch(value: datetime) -> float:
+    # Models use naive UTC datetimes (datetime.utcnow)
+    return (value - datetime(1970, 1, 1)).total_seconds()
@@ -0,0 +1,110 @@
+import math
+import re
+
+from core.page_index import tokenize
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+# Question words that tell us what kind of span to pull out of the sentence
+QUESTION_FILLER = frozenset({"many", "much", "year", "date", "define", "meaning", "mean", "means", "called"})
+
+YEAR_OR_DATE = re.compile(
+    r"\b(?:(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2},?\s+\d{4}"
+    r"|\d{1,2}\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{4}"
+    r"|\d{1,4}[/-]\d{1,2}[/-]\d{1,4}"
+    r"|1\d{3}|20\d{2})\b",
+    re.IGNORECASE,
+)
+NUMBER = re.compile(r"\b\d[\d,]*(?:\.\d+)?(?:\s*%|\s+[A-Za-z]+)?")
+PROPER_NOUN = re.compile(r"\b[A-Z][a-zA-Z'\-]+(?:\s+(?:of|de|the|[A-Z][a-zA-Z'\-]+))*")
+DEFINITION = re.compile(r"\b(?:is|are|was|were|means|refers to|is defined as|is called)\s+(.+)", re.IGNORECASE)
+
+# Untyped questions get the whole sentence back — trust that a bit less
+SENTENCE_ANSWER_WEIGHT = 0.85
+MAX_ANSWER_CHARS = 300
+
+
+def answer_from_text(question: str, text: str) -> tuple[str, float] | None:
+    """
+    Extractive answer for `question` from a page's text layer.
+
+    Picks the sentence covering the most (idf-weighted) question terms, then
+    pulls the span the question asks for — a date for "when", a number for
+    "how many", a name for "who", the definition for "what is". Returns
+    (answer, score in 0..1), or None when the text has nothing to match.
+    """
+    terms = [_stem(term) for term in dict.fromkeys(tokenize(question)) if term not in QUESTION_FILLER]
+    sentences = [s.strip() for s in SENTENCE_SPLIT.split(re.sub(r"\s+", " ", text)) if s.strip()]
+    if not terms or not sentences:
+        return None
+
+    sentence_terms = [{_stem(term) for term in tokenize(sentence)} for sentence in sentences]
+    idf = {
+        term: math.log(1 + len(sentences) / (1 + sum(term in found for found in sentence_terms)))
+        for term in terms
+    }
+    total_weight = sum(idf.values())
+
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda index: -sum(idf[term] for term in terms if term in sentence_terms[index]),
+    )
+    kind = _question_kind(question)
+
+    best: tuple[str, float] | None = None
+    # The span may sit in the runner-up sentence (e.g. the year is in the next one)
+    for index in ranked[:3]:
+        coverage = sum(idf[term] for term in terms if term in sentence_terms[index]) / total_weight
+        if coverage == 0:
+            break
+        span = _extract_span(kind, question, sentences[index])
+        if span is not None:
+            candidate = (span, coverage)
+        else:
+            weight = SENTENCE_ANSWER_WEIGHT if kind == "sentence" else SENTENCE_ANSWER_WEIGHT / 2
+            candidate = (sentences[index][:MAX_ANSWER_CHARS], coverage * weight)
+        if best is None or candidate[1] > best[1]:
+            best = candidate
+
+    if best is None:
+        return None
+    return best[0], round(best[1], 4)
+
+
+def _stem(term: str) -> str:
+    # Just enough suffix stripping for "ended"/"ends"/"ending" to meet "end"
+    for suffix in ("ing", "ed", "es", "s"):
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3 and not term.endswith("ss"):
+            return term[: -len(suffix)]
+    return term
+
+
+def _question_kind(question: str) -> str:
+    lowered = question.lower().strip()
+    if lowered.startswith("when") or re.search(r"\b(?:what|which) (?:year|date)\b", lowered):
+        return "date"
+    if re.search(r"\bhow (?:many|much|long|old)\b", lowered):
+        return "number"
+    if lowered.startswith("who"):
+        return "person"
+    if re.match(r"(?:what|who) (?:is|are) (?:a |an |the )?\w+", lowered) or lowered.startswith("define"):
+        return "definition"
+    return "sentence"
+
+
+def _extract_span(kind: str, question: str, sentence: str) -> str | None:
+    if kind == "date":
+        match = YEAR_OR_DATE.search(sentence)
+        return match.group(0) if match else None
+    if kind == "number":
+        match = NUMBER.search(sentence)
+        return match.group(0).strip() if match else None
+    if kind == "person":
+        asked = set(tokenize(question))
+        for match in PROPER_NOUN.finditer(sentence):
+            if not set(tokenize(match.group(0))) & asked:
+                return match.group(0)
+        return None
+    if kind == "definition":
+        match = DEFINITION.search(sentence)
+        return match.group(1).rstrip(".")[:MAX_ANSWER_CHARS] if match else None
+    return None
@@ -0,0 +1,206 @@
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
+import copy
+import os
+from pathlib import Path
+import threading
+
+import torch
+from transformers import VisionEncoderDecoderModel
+
+# fp32  — full precision (reference)
+# int8  — dynamic int8 quantization of every nn.Linear (weights int8, activations quantized per call)
+# bf16  — bfloat16 autocast; falls back to fp32 on CPUs without native bf16 support
+# onnx  — Swin encoder exported to ONNX and run by ONNX Runtime; decoder stays fp32 torch
+INFERENCE_MODES = ("fp32", "int8", "bf16", "onnx")
+
+# /proc/cpuinfo flags of CPUs with native bf16 matmuls (AVX512-BF16 / AMX);
+# plain AVX-512 CPUs (Skylake, Cascade Lake) only emulate bf16 and run slower than fp32
+BF16_CPU_FLAGS = {"avx512_bf16", "amx_bf16"}
+
+
+class DonutInferenceBackend:
+    """
+    Runs the Donut encoder and `generate` for one CPU inference mode.
+
+    Every mode runs under `torch.inference_mode`. By default the original
+    model is left untouched — int8 works on a quantized copy — so several
+    backends can be compared side by side (see `benchmarks/donut_inference_modes.py`).
+    With `in_place`, int8 quantizes `model` itself instead, so the fp32
+    weights are not kept next to the int8 ones.
+    `mode` is the mode actually in use (bf16 may fall back to fp32).
+    `pads_prompts` tells whether `generate` accepts left-padded prompts of
+    different lengths in one batch (see `generate`).
+    """
+
+    def __init__(
+        self,
+        model: VisionEncoderDecoderModel,
+        mode: str = "fp32",
+        onnx_dir: Path = Path("data/onnx"),
+        in_place: bool = False,
+    ) -> None:
+        if mode not in INFERENCE_MODES:
+            raise ValueError(f"Unknown inference mode {mode!r}; expected one of {', '.join(INFERENCE_MODES)}.")
+
+        self.requested_mode = mode
+        self.mode = mode
+        self.model = model
+        self._onnx_session = None
+
+        if mode == "int8":
+            self.model = torch.ao.quantization.quantize_dynamic(
+                model if in_place else copy.deepcopy(model),
+                {torch.nn.Linear},
+                dtype=torch.qint8,
+                inplace=in_place,
+            )
+            self.model.eval()
+        elif mode == "bf16" and not cpu_supports_bf16():
+            self.mode = "fp32"
+        elif mode == "onnx":
+            self._onnx_session = _load_onnx_encoder(model, onnx_dir)
+
+        self.pads_prompts = _LeftPaddedPositions.install(self.model)
+
+    def encode(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        """Encoder hidden states for a batch of preprocessed pages."""
+        if self._onnx_session is not None:
+            (hidden_states,) = self._onnx_session.run(
+                ["last_hidden_state"],
+                {"pixel_values": pixel_values.numpy()},
+            )
+            return torch.from_numpy(hidden_states)
+
+        with self._inference():
+            return self.model.encoder(pixel_values=pixel_values).last_hidden_state
+
+    def generate(self, prompt_padding: torch.Tensor | None = None, **kwargs):
+        """
+        `model.generate` in this backend's mode.
+
+        For a batch of left-padded prompts, pass the number of pad tokens per
+        row as `prompt_padding` (and the matching `decoder_attention_mask`):
+        each row's positions then start at its first real token, so it decodes
+        exactly as it would alone. Needs `pads_prompts`.
+        """
+        if prompt_padding is None:
+            with self._inference():
+                return self.model.generate(**kwargs)
+
+        if not self.pads_prompts:
+            raise ValueError("This decoder cannot shift positions for left-padded prompts.")
+        _prompt_padding.rows = prompt_padding
+        try:
+            with self._inference():
+                return self.model.generate(**kwargs)
+        finally:
+            _prompt_padding.rows = None
+
+    @contextmanager
+    def _inference(self) -> Iterator[None]:
+        autocast = torch.autocast("cpu", dtype=torch.bfloat16) if self.mode == "bf16" else nullcontext()
+        with torch.inference_mode(), autocast:
+            yield
+
+
+def cpu_supports_bf16() -> bool:
+    # torch.backends.cpu.get_cpu_capability() tops out at "AVX512" — it cannot
+    # tell native bf16 from emulated, so ask for the instructions themselves
+    is_avx512_bf16 = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    is_amx_tile = getattr(torch.cpu, "_is_amx_tile_supported", None)
+    if is_avx512_bf16 is not None and is_amx_tile is not None:
+        return is_avx512_bf16() or is_amx_tile()
+
+    # Older torch: read the CPU flags (Linux only)
+    try:
+        cpuinfo = Path("/proc/cpuinfo").read_text()
+    except OSError:
+        return False
+    for line in cpuinfo.splitlines():
+        if line.startswith("flags"):
+            return not BF16_CPU_FLAGS.isdisjoint(line.split())
+    return False
+
+
+# Pad tokens per row of the `generate` call running on this thread — the
+# inference slots share one model, so this cannot live on the module itself
+_prompt_padding = threading.local()
+
+
+class _LeftPaddedPositions(torch.nn.Module):
+    # MBart (Donut's decoder) numbers positions from the cache length, the same
+    # for every row; a left-padded row has to count from its first real token
+    def __init__(self, embedding: torch.nn.Embedding) -> None:
+        super().__init__()
+        self.embedding = embedding
+
+    @classmethod
+    def install(cls, model: VisionEncoderDecoderModel) -> bool:
+        decoder = getattr(getattr(model.decoder, "model", None), "decoder", None)
+        embedding = getattr(decoder, "embed_positions", None)
+        if isinstance(embedding, cls):
+            return True
+        if not isinstance(embedding, torch.nn.Embedding) or not hasattr(embedding, "offset"):
+            return False
+        decoder.embed_positions = cls(embedding)
+        return True
+
+    def forward(self, input_ids: torch.Tensor, past_key_values_length: int = 0, **kwargs) -> torch.Tensor:
+        padding = getattr(_prompt_padding, "rows", None)
+        if padding is None:
+            return self.embedding(input_ids, past_key_values_length, **kwargs)
+
+        position_ids = kwargs.get("position_ids")
+        if position_ids is None:
+            position_ids = torch.arange(past_key_values_length, past_key_values_length + input_ids.shape[1])
+        device = self.embedding.weight.device
+        positions = position_ids.view(1, -1).to(device) - padding.view(-1, 1).to(device)
+        # Pad tokens land below 0 — they are masked out, any position will do
+        positions = positions.clamp(min=0) + self.embedding.offset
+        return torch.nn.functional.embedding(positions, self.embedding.weight)
+
+
+def _load_onnx_encoder(model: VisionEncoderDecoderModel, onnx_dir: Path):
+    try:
+        import onnxruntime
+    except ImportError as exc:
+        raise RuntimeError("DONUT_INFERENCE_MODE=onnx requires `pip install onnxruntime`.") from exc
+
+    # Exported once, then reused across restarts
+    model_slug = (model.name_or_path or model.config.encoder.model_type).replace("/", "--")
+    onnx_path = onnx_dir / f"{model_slug}-encoder.onnx"
+    if not onnx_path.exists():
+        onnx_dir.mkdir(parents=True, exist_ok=True)
+        encoder_config = model.config.encoder
+        height, width = encoder_config.image_size
+        dummy_pixels = torch.zeros(1, encoder_config.num_channels, height, width)
+        # Every worker may export at once: each writes its own file and renames
+        # it into place, so nobody opens a half-written model
+        temp_path = onnx_path.with_name(f"{onnx_path.stem}.{os.getpid()}.tmp")
+        try:
+            torch.onnx.export(
+                _EncoderForExport(model.encoder),
+                (dummy_pixels,),
+                str(temp_path),
+                input_names=["pixel_values"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "last_hidden_state": {0: "batch"}},
+            )
+            os.replace(temp_path, onnx_path)
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return onnxruntime.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+
+
+class _EncoderForExport(torch.nn.Module):
+    # ONNX export wants a plain tensor in, tensor out
+    def __init__(self, encoder: torch.nn.Module) -> None:
+        super().__init__()
+        self.encoder = encoder
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return self.encoder(pixel_values=pixel_values).last_hidden_state
@@ -0,0 +1,85 @@
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+from typing import TypeVar
+
+import torch
+from fastapi import HTTPException, status
+
+R = TypeVar("R")
+
+INFERENCE_RETRY_AFTER_SECONDS = 2
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool that owns all model inference.
+
+    - `slots` worker threads; each sets `torch.set_num_threads(threads_per_slot)`
+      on start (OpenMP thread counts are per calling thread), so
+      slots x threads_per_slot can be sized to the node's cores.
+    - At most `max_queued` calls wait for a free slot; past that `run`
+      rejects with 503 + Retry-After instead of piling up work.
+    - `stats()` reports queue depth and how long calls waited for a slot.
+    """
+
+    def __init__(self, slots: int, threads_per_slot: int, max_queued: int, name: str = "inference") -> None:
+        self.slots = max(1, slots)
+        self.threads_per_slot = max(1, threads_per_slot)
+        self._max_queued = max(0, max_queued)
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.slots,
+            thread_name_prefix=name,
+            initializer=torch.set_num_threads,
+            initargs=(self.threads_per_slot,),
+        )
+        self._lock = Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def run(self, fn: Callable[..., R], *args) -> R:
+        """Run `fn(*args)` on a free slot and block until it returns."""
+        with self._lock:
+            if self._queued >= self._max_queued + self.slots - self._running:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Inference queue is full. Try again shortly.",
+                    headers={"Retry-After": str(INFERENCE_RETRY_AFTER_SECONDS)},
+                )
+            self._queued += 1
+
+        return self._pool.submit(self._call, monotonic(), fn, args).result()
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "slots": self.slots,
+                "threads_per_slot": self.threads_per_slot,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait_seconds / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self._max_wait_seconds * 1000, 2),
+            }
+
+    def _call(self, submitted_at: float, fn: Callable[..., R], args: tuple) -> R:
+        waited = monotonic() - submitted_at
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
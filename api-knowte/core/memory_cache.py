@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from threading import Lock
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class MemoryBudgetCache(Generic[K, V]):
+    """
+    Thread-safe LRU cache bounded by the total size of its values in bytes.
+
+    - `sizeof` returns how many bytes a value holds in memory.
+    - Least-recently-used entries are evicted until the budget fits.
+    - Values larger than the whole budget are never cached.
+    - `hits` / `misses` / `evictions` count lookups and budget evictions.
+    - With `group`, keys are also indexed by `group(key)` so `discard_group`
+      drops one group (e.g. everything for one document) without a full scan.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        sizeof: Callable[[V], int],
+        group: Callable[[K], Hashable] | None = None,
+    ) -> None:
+        self._max_bytes = max(0, max_bytes)
+        self._sizeof = sizeof
+        self._group = group
+        self._entries: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._groups: dict[Hashable, set[K]] = {}
+        self._current_bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def current_bytes(self) -> int:
+        return self._current_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        size = self._sizeof(value)
+        with self._lock:
+            self._pop_locked(key)
+            if size > self._max_bytes:
+                return
+
+            self._entries[key] = (value, size)
+            self._current_bytes += size
+            if self._group is not None:
+                self._groups.setdefault(self._group(key), set()).add(key)
+            while self._current_bytes > self._max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._pop_locked(oldest_key)
+                self.evictions += 1
+
+    def pop(self, key: K) -> V | None:
+        with self._lock:
+            return self._pop_locked(key)
+
+    def discard_where(self, predicate: Callable[[K], bool]) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                self._pop_locked(key)
+
+    def discard_group(self, group: Hashable) -> None:
+        """Drop every entry whose key maps to `group` — O(entries in the group)."""
+        if self._group is None:
+            raise RuntimeError("Cache was created without a group function.")
+        with self._lock:
+            for key in list(self._groups.get(group, ())):
+                self._pop_locked(key)
+
+    def usage_by(self, group: Callable[[K], Hashable]) -> dict[Hashable, int]:
+        """Bytes currently held, summed per `group(key)`."""
+        usage: dict[Hashable, int] = {}
+        with self._lock:
+            for key, (_, size) in self._entries.items():
+                name = group(key)
+                usage[name] = usage.get(name, 0) + size
+        return usage
+
+    def _pop_locked(self, key: K) -> V | None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._current_bytes -= entry[1]
+        if self._group is not None:
+            group = self._group(key)
+            keys = self._groups.get(group)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[group]
+        return entry[0]
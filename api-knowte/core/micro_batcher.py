@@ -0,0 +1,92 @@
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import monotonic
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects items submitted from many request threads and runs them through
+    `run_batch` together.
+
+    - The first pending item opens a batch window of `max_wait_ms`.
+    - The batch runs as soon as it has `max_batch_size` items or the window closes.
+    - `run_batch` must return one result per item, in the same order.
+    - Each caller gets back its own result (or the batch's exception).
+    - `workers` batches can run at once; while all are busy, new items
+      queue up and join the next batch.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[T]], Sequence[R]],
+        max_batch_size: int,
+        max_wait_ms: int,
+        name: str = "micro-batcher",
+        workers: int = 1,
+    ) -> None:
+        self._run_batch = run_batch
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait_seconds = max(0, max_wait_ms) / 1000
+        self._name = name
+        self._worker_count = max(1, workers)
+        self._queue: Queue[tuple[T, Future[R]]] = Queue()
+        self._workers: list[Thread] = []
+        self._worker_lock = Lock()
+
+    def submit(self, item: T) -> R:
+        """Queue one item and block until its batch has run."""
+        self._ensure_worker()
+        future: Future[R] = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    @property
+    def pending(self) -> int:
+        """Items waiting to join a batch."""
+        return self._queue.qsize()
+
+    def _ensure_worker(self) -> None:
+        if self._workers:
+            return
+        with self._worker_lock:
+            if not self._workers:
+                for index in range(self._worker_count):
+                    worker = Thread(target=self._work, name=f"{self._name}-{index}", daemon=True)
+                    worker.start()
+                    self._workers.append(worker)
+
+    def _work(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = monotonic() + self._max_wait_seconds
+            while len(batch) < self._max_batch_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except Empty:
+                    break
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: list[tuple[T, Future[R]]]) -> None:
+        try:
+            results = self._run_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"{self._name} returned {len(results)} results for {len(batch)} items."
+                )
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,169 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+from collections.abc import Callable
+from pathlib import Path
+from threading import local
+
+from fastapi import HTTPException, status
+
+# Messages: 4-byte big-endian header length, JSON header, then the binary
+# blobs listed in header["blob_sizes"] (page renders), back to back
+HEADER_LENGTH = struct.Struct("!I")
+MODEL_SERVER_TIMEOUT_SECONDS = 120
+MODEL_SERVER_RETRY_AFTER_SECONDS = 2
+
+
+def send_message(sock: socket.socket, header: dict, blobs: list[bytes] | None = None) -> None:
+    blobs = blobs or []
+    encoded = json.dumps({**header, "blob_sizes": [len(blob) for blob in blobs]}).encode()
+    sock.sendall(HEADER_LENGTH.pack(len(encoded)) + encoded)
+    for blob in blobs:
+        sock.sendall(blob)
+
+
+def recv_message(sock: socket.socket) -> tuple[dict, list[bytes]]:
+    (length,) = HEADER_LENGTH.unpack(_recv_exactly(sock, HEADER_LENGTH.size))
+    header = json.loads(_recv_exactly(sock, length))
+    blobs = [_recv_exactly(sock, size) for size in header.pop("blob_sizes", [])]
+    return header, blobs
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Model server connection closed.")
+        received += count
+    return bytes(buffer)
+
+
+class ModelServerClient:
+    """
+    Worker side of the Donut model server (DONUT_SERVER_SOCKET).
+
+    One persistent Unix socket connection per calling thread. Questions are
+    sent as (content_hash, [(page, question), ...]); a page's PNG render is
+    only sent when the server asks for it (it has neither the page nor its
+    encoder states cached). Server-side HTTP errors (e.g. 503 when its
+    inference queue is full) are re-raised as the same HTTPException.
+    """
+
+    def __init__(self, socket_path: Path) -> None:
+        self.socket_path = socket_path
+        self._local = local()
+
+    def info(self) -> dict:
+        return self._call({"op": "info"})
+
+    def answer(
+        self,
+        content_hash: str,
+        pairs: list[tuple[int, str]],
+        page_render: Callable[[int], bytes],
+    ) -> list[tuple[str, float]]:
+        request = {"op": "answer", "content_hash": content_hash, "pairs": pairs}
+        reply = self._call(request)
+        if reply.get("need_pages"):
+            pages = reply["need_pages"]
+            reply = self._call({**request, "pages": pages}, [page_render(page) for page in pages])
+        return [(answer, confidence) for answer, confidence in reply["answers"]]
+
+    def _call(self, header: dict, blobs: list[bytes] | None = None) -> dict:
+        # A kept-alive connection may have been closed by a server restart: retry once on a new one
+        for attempt in range(2):
+            reused = getattr(self._local, "sock", None) is not None
+            try:
+                sock = self._connection()
+                send_message(sock, header, blobs)
+                reply, _ = recv_message(sock)
+                break
+            except OSError as exc:
+                self._close()
+                if reused and attempt == 0 and not isinstance(exc, TimeoutError):
+                    continue
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Donut model server is unavailable.",
+                    headers={"Retry-After": str(MODEL_SERVER_RETRY_AFTER_SECONDS)},
+                ) from exc
+
+        if "error" in reply:
+            raise HTTPException(status_code=reply["status"], detail=reply["error"], headers=reply.get("headers"))
+        return reply
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(MODEL_SERVER_TIMEOUT_SECONDS)
+            try:
+                sock.connect(str(self.socket_path))
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves one process's Donut model to every API worker on the node.
+
+    Each worker connection gets its own thread, so questions from different
+    workers meet in the service's micro-batcher and share `generate` calls.
+    `service` is a `DocumentService` running the model locally.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, service) -> None:
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if socket_path.exists():
+            socket_path.unlink()  # left over from a previous run
+        self.service = service
+        super().__init__(str(socket_path), _ModelServerHandler)
+        os.chmod(socket_path, 0o600)
+
+    def dispatch(self, header: dict, blobs: list[bytes]) -> dict:
+        try:
+            if header["op"] == "info":
+                input_size = self.service.model_input_size()
+                return {
+                    "readiness": self.service.get_readiness(),
+                    "input_size": list(input_size) if input_size else None,
+                }
+            if header["op"] == "answer":
+                renders = dict(zip(header.get("pages", []), blobs))
+                pairs = [(page, question) for page, question in header["pairs"]]
+                answers, missing = self.service.serve_page_questions(header["content_hash"], pairs, renders)
+                if missing:
+                    return {"need_pages": missing}
+                return {"answers": answers}
+            return {"error": f"Unknown op {header['op']!r}.", "status": status.HTTP_400_BAD_REQUEST}
+        except HTTPException as exc:
+            return {"error": exc.detail, "status": exc.status_code, "headers": exc.headers}
+        except Exception as exc:
+            return {"error": str(exc) or exc.__class__.__name__, "status": status.HTTP_500_INTERNAL_SERVER_ERROR}
+
+
+class _ModelServerHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        # One worker thread's connection: requests one after another until it closes
+        while True:
+            try:
+                header, blobs = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            send_message(self.request, self.server.dispatch(header, blobs))
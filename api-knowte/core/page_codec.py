@@ -0,0 +1,68 @@
+from io import BytesIO
+
+import fitz
+from PIL import Image
+
+from core.page_preprocess import pixmap_array
+
+PAGE_FORMATS = ("raw", "gray", "png", "jpeg", "webp")
+PAGE_JPEG_QUALITY = 90
+PAGE_WEBP_QUALITY = 90
+
+
+class PageCodec:
+    """
+    How a worker keeps rendered pages in memory (DOCUMENT_PAGE_FORMAT).
+
+    - "raw":  the RGB pixmap as rendered — no decoding, ~6 MB per letter page.
+    - "gray": one uint8 channel for pages whose pixels are all gray (text-only
+      pages, lossless, a third of "raw"); pages with color fall back to PNG.
+    - "png" / "jpeg" / "webp": compressed bytes, decoded when the page is
+      encoded. PNG is lossless and is what the document store already holds.
+    PyMuPDF is not thread-safe: call `compact` and `decode` under the
+    caller's render lock.
+    """
+
+    def __init__(self, page_format: str) -> None:
+        if page_format not in PAGE_FORMATS:
+            raise ValueError(f"Unknown page format {page_format!r}; expected one of {', '.join(PAGE_FORMATS)}.")
+        self.page_format = page_format
+
+    def compact(self, png: bytes, pixmap: fitz.Pixmap | None = None) -> fitz.Pixmap | bytes:
+        """
+        Storage form of a rendered page, from its PNG and (if already at hand)
+        its RGB pixmap.
+        """
+        if self.page_format == "png":
+            return png
+
+        if pixmap is None:
+            pixmap = fitz.Pixmap(png)
+        if self.page_format == "raw":
+            return pixmap
+        if self.page_format == "gray":
+            return fitz.Pixmap(fitz.csGRAY, pixmap) if _is_gray(pixmap) else png
+        if self.page_format == "jpeg":
+            return pixmap.tobytes("jpeg", jpg_quality=PAGE_JPEG_QUALITY)
+
+        image = Image.frombuffer("RGB", (pixmap.width, pixmap.height), pixmap.samples_mv, "raw", "RGB", pixmap.stride, 1)
+        buffer = BytesIO()
+        image.save(buffer, "WEBP", quality=PAGE_WEBP_QUALITY)
+        return buffer.getvalue()
+
+    @staticmethod
+    def decode(data: fitz.Pixmap | bytes) -> fitz.Pixmap:
+        """Pixmap for a stored page; "raw" / "gray" pages are returned as they are."""
+        if isinstance(data, fitz.Pixmap):
+            return data
+        if data[8:12] == b"WEBP":
+            # MuPDF does not read WebP
+            with Image.open(BytesIO(data)) as image:
+                rgb = image.convert("RGB")
+            return fitz.Pixmap(fitz.csRGB, rgb.width, rgb.height, rgb.tobytes(), False)
+        return fitz.Pixmap(data)
+
+
+def _is_gray(pixmap: fitz.Pixmap) -> bool:
+    pixels = pixmap_array(pixmap)
+    return bool((pixels[..., 0] == pixels[..., 1]).all() and (pixels[..., 1] == pixels[..., 2]).all())
@@ -0,0 +1,79 @@
+import json
+import math
+import re
+from collections import Counter
+
+# Okapi BM25 parameters (the usual defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    """
+    a an and are as at be by can did do does for from has have how in is it its
+    of on or page that the their this to was were what when where which who why
+    with you your ano ang mga ng sa na ba
+    """.split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [term for term in TERM_PATTERN.findall(text.lower()) if len(term) > 1 and term not in STOPWORDS]
+
+
+class PageIndex:
+    """
+    BM25 inverted index over the text of each page of one document.
+
+    - Built once at ingest from the per-page text and stored as JSON.
+    - `rank(query)` scores only the pages that contain a query term.
+    Pages are 1-based, like everywhere else in the API.
+    """
+
+    def __init__(self, postings: dict[str, list[tuple[int, int]]], page_lengths: list[int]) -> None:
+        # postings: term -> [(page, term frequency), ...]
+        self.postings = postings
+        self.page_lengths = page_lengths
+        self._average_length = (sum(page_lengths) / len(page_lengths)) if page_lengths else 0.0
+
+    @classmethod
+    def from_page_texts(cls, page_texts: list[str]) -> "PageIndex":
+        postings: dict[str, list[tuple[int, int]]] = {}
+        page_lengths: list[int] = []
+        for page, text in enumerate(page_texts, start=1):
+            terms = tokenize(text)
+            page_lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append((page, frequency))
+        return cls(postings, page_lengths)
+
+    @classmethod
+    def from_json(cls, data: str) -> "PageIndex":
+        raw = json.loads(data)
+        postings = {term: [(page, tf) for page, tf in entries] for term, entries in raw["postings"].items()}
+        return cls(postings, raw["page_lengths"])
+
+    def to_json(self) -> str:
+        return json.dumps({"postings": self.postings, "page_lengths": self.page_lengths}, separators=(",", ":"))
+
+    def rank(self, query: str, top_k: int) -> list[tuple[int, float]]:
+        """Best `top_k` pages for `query` as (page, score); empty if no page matches."""
+        page_count = len(self.page_lengths)
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            entries = self.postings.get(term)
+            if not entries:
+                continue
+            idf = math.log(1 + (page_count - len(entries) + 0.5) / (len(entries) + 0.5))
+            for page, frequency in entries:
+                length_norm = 1 - BM25_B + BM25_B * self.page_lengths[page - 1] / (self._average_length or 1)
+                scores[page] = scores.get(page, 0.0) + idf * frequency * (BM25_K1 + 1) / (
+                    frequency + BM25_K1 * length_norm
+                )
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k]
+
+    def nbytes(self) -> int:
+        # Rough in-memory size: term strings + one (page, tf) tuple per posting
+        return sum(len(term) + 49 + 64 * len(entries) for term, entries in self.postings.items())
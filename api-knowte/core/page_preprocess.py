@@ -0,0 +1,130 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# PIL resample codes (what DonutImageProcessor.resample holds) -> interpolate mode
+RESAMPLE_MODES = {0: "nearest", 2: "bilinear", 3: "bicubic"}
+# Largest |difference| allowed against DonutImageProcessor's pixel_values
+# (normalized units, range -1..1): about one uint8 step after normalization
+PREPROCESS_TOLERANCE = 2 / 127.5
+
+
+def pixmap_array(pixmap) -> np.ndarray:
+    """
+    (height, width, channels) uint8 view of a PyMuPDF pixmap's samples — no copy.
+    The view is only valid while `pixmap` is alive; keep a reference to it.
+    """
+    return np.frombuffer(pixmap.samples_mv, dtype=np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)
+
+
+class DonutPagePreprocessor:
+    """
+    Builds Donut `pixel_values` straight from page pixel arrays.
+
+    Same steps as `DonutImageProcessor` — optional long-axis rotation, resize
+    of the shortest edge, thumbnail, centered zero padding, rescale and
+    normalize — but without PIL images in between:
+    - the HWC uint8 array is used as a channels-last tensor in place,
+    - resizing runs on uint8 (like the processor's torchvision backend),
+    - rescale + normalize write straight into one preallocated batch tensor,
+      which already holds the normalized padding value.
+    Grayscale pages (1 channel) are resized once and broadcast to RGB.
+    Output matches the processor within `PREPROCESS_TOLERANCE`.
+    """
+
+    def __init__(
+        self,
+        height: int,
+        width: int,
+        image_mean: list[float],
+        image_std: list[float],
+        rescale_factor: float = 1 / 255,
+        resample: int = 2,
+        do_resize: bool = True,
+        do_thumbnail: bool = True,
+        do_pad: bool = True,
+        do_align_long_axis: bool = False,
+    ) -> None:
+        self.height = height
+        self.width = width
+        self._mode = RESAMPLE_MODES.get(int(resample), "bilinear")
+        self._do_resize = do_resize
+        self._do_thumbnail = do_thumbnail
+        self._do_pad = do_pad
+        self._do_align_long_axis = do_align_long_axis
+        mean = torch.tensor(image_mean, dtype=torch.float32).view(3, 1, 1)
+        std = torch.tensor(image_std, dtype=torch.float32).view(3, 1, 1)
+        # pixel * scale + shift == (pixel * rescale_factor - mean) / std
+        self._scale = rescale_factor / std
+        self._shift = -mean / std
+
+    @classmethod
+    def from_image_processor(cls, image_processor) -> "DonutPagePreprocessor":
+        size = image_processor.size
+        return cls(
+            height=size["height"],
+            width=size["width"],
+            image_mean=list(image_processor.image_mean),
+            image_std=list(image_processor.image_std),
+            rescale_factor=getattr(image_processor, "rescale_factor", 1 / 255),
+            resample=getattr(image_processor, "resample", 2),
+            do_resize=getattr(image_processor, "do_resize", True),
+            do_thumbnail=getattr(image_processor, "do_thumbnail", True),
+            do_pad=getattr(image_processor, "do_pad", True),
+            do_align_long_axis=getattr(image_processor, "do_align_long_axis", False),
+        )
+
+    def __call__(self, pages: list[np.ndarray]) -> torch.Tensor:
+        """`pixel_values` (batch, 3, height, width) for (H, W, C) uint8 page arrays."""
+        pixel_values = torch.empty((len(pages), 3, self.height, self.width), dtype=torch.float32)
+        # Zero padding, already normalized
+        pixel_values.copy_(self._shift.expand(3, self.height, self.width))
+
+        for index, page in enumerate(pages):
+            resized = self._resize(page)
+            height, width = resized.shape[-2:]
+            top = (self.height - height) // 2 if self._do_pad else 0
+            left = (self.width - width) // 2 if self._do_pad else 0
+            target = pixel_values[index, :, top : top + height, left : left + width]
+            target.copy_(resized[0].expand(3, height, width))
+            target.mul_(self._scale).add_(self._shift)
+        return pixel_values
+
+    def _resize(self, page: np.ndarray) -> torch.Tensor:
+        # HWC uint8 is NCHW channels-last once permuted — no copy
+        image = torch.from_numpy(page).permute(2, 0, 1).unsqueeze(0)
+        channels = image.shape[1]
+        if channels == 2 or channels == 4:  # drop alpha
+            image = image[:, : channels - 1]
+
+        if self._do_align_long_axis:
+            height, width = image.shape[-2:]
+            if (self.width < self.height and width > height) or (self.width > self.height and width < height):
+                image = torch.rot90(image, 3, dims=[2, 3])
+
+        if self._do_resize:
+            height, width = image.shape[-2:]
+            shortest = min(self.height, self.width)
+            if height <= width:
+                size = (shortest, int(shortest * width / height))
+            else:
+                size = (int(shortest * height / width), shortest)
+            image = self._interpolate(image, size)
+
+        if self._do_thumbnail:
+            height, width = image.shape[-2:]
+            new_height, new_width = min(height, self.height), min(width, self.width)
+            if (new_height, new_width) != (height, width):
+                if height > width:
+                    new_width = int(width * new_height / height)
+                elif width > height:
+                    new_height = int(height * new_width / width)
+                image = self._interpolate(image, (new_height, new_width))
+        return image
+
+    def _interpolate(self, image: torch.Tensor, size: tuple[int, int]) -> torch.Tensor:
+        if tuple(image.shape[-2:]) == size:
+            return image
+        if self._mode == "nearest":
+            return F.interpolate(image, size=size, mode="nearest")
+        return F.interpolate(image, size=size, mode=self._mode, antialias=True, align_corners=False)
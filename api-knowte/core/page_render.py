@@ -0,0 +1,70 @@
+import fitz
+
+RENDER_PROFILES = ("fixed", "model", "adaptive")
+# Zoom of the "fixed" profile (144 DPI);
+# zoom=2 para mas malinaw yung image na nakuha angas (mas accurate si Donut)
+FIXED_RENDER_ZOOM = 2
+# "adaptive": when the smallest text on a page would be under this many
+# pixels (font size at model input resolution), render it larger so the
+# processor's antialiased downscale keeps the glyphs legible
+SMALL_TEXT_MIN_PIXELS = 18
+SMALL_TEXT_PERCENTILE = 0.1
+MAX_SUPERSAMPLE = 2.0
+
+
+class RenderProfile:
+    """
+    Zoom for rasterizing a PDF page for Donut (DOCUMENT_RENDER_PROFILE).
+
+    - "fixed":    always `FIXED_RENDER_ZOOM`; the processor then resizes.
+    - "model":    the zoom at which the page comes out at exactly the size
+      the processor would resize it to (shortest edge, then fit inside its
+      height x width), so no pixels are rendered only to be thrown away.
+    - "adaptive": "model", but pages whose smallest text would be under
+      `SMALL_TEXT_MIN_PIXELS` are rendered up to `MAX_SUPERSAMPLE`x larger.
+    Pages are fitted as they are — processors that rotate pages
+    (`do_align_long_axis`) still get a correct, just not exact, render.
+    """
+
+    def __init__(self, profile: str) -> None:
+        if profile not in RENDER_PROFILES:
+            raise ValueError(f"Unknown render profile {profile!r}; expected one of {', '.join(RENDER_PROFILES)}.")
+        self.profile = profile
+
+    def zoom(self, page: fitz.Page, target_height: int, target_width: int) -> float:
+        if self.profile == "fixed":
+            return FIXED_RENDER_ZOOM
+
+        width, height = page.rect.width, page.rect.height
+        shortest = min(target_height, target_width)
+        zoom = min(shortest / min(width, height), target_height / height, target_width / width)
+        if self.profile == "model":
+            return zoom
+
+        text_size = _small_text_size(page)
+        if text_size is None or text_size * zoom >= SMALL_TEXT_MIN_PIXELS:
+            return zoom
+        return zoom * min(MAX_SUPERSAMPLE, SMALL_TEXT_MIN_PIXELS / (text_size * zoom))
+
+
+def _small_text_size(page: fitz.Page) -> float | None:
+    # Font size (pt) below which SMALL_TEXT_PERCENTILE of the page's characters
+    # fall; None for pages without a text layer (scans)
+    sizes: list[tuple[float, int]] = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                chars = len(span["text"].strip())
+                if chars and span["size"] > 0:
+                    sizes.append((span["size"], chars))
+    if not sizes:
+        return None
+
+    sizes.sort()
+    cutoff = sum(chars for _, chars in sizes) * SMALL_TEXT_PERCENTILE
+    seen = 0
+    for size, chars in sizes:
+        seen += chars
+        if seen >= cutoff:
+            return size
+    return sizes[-1][0]
@@ -0,0 +1,23 @@
+import fitz  # PyMuPDF
+
+# Runs inside the document ingest process pool. Keep this module light —
+# spawned workers import it without loading torch/transformers.
+
+
+def extract_page_range(pdf_path: str, start: int, stop: int) -> list[str]:
+    """
+    Extract the plain text of pages [start, stop) (0-based), in page order.
+    Each worker opens its own document handle — fitz objects cannot be
+    shared across threads or processes.
+    """
+    with fitz.open(pdf_path) as pdf:
+        return [pdf[page_num].get_text() for page_num in range(start, min(stop, len(pdf)))]
+
+
+def plan_page_shards(page_count: int, workers: int, min_pages_per_shard: int) -> list[tuple[int, int]]:
+    """Split [0, page_count) into contiguous (start, stop) shards, about one per worker."""
+    if page_count <= 0:
+        return []
+
+    shard_size = max(min_pages_per_shard, -(-page_count // max(1, workers)))
+    return [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
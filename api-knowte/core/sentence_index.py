@@ -0,0 +1,57 @@
+import json
+import re
+from collections import Counter
+from collections.abc import Iterator
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+# Cloze candidates: words of 5+ characters
+KEYWORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9\-]{4,}")
+
+
+class SentenceIndex:
+    """
+    Sentences of one document with their cloze keywords, built once at ingest.
+
+    Shared by the flashcard and quiz fallbacks so neither has to re-normalize,
+    re-split and re-scan the extracted text on every request.
+    - `sentences`: whitespace-normalized sentences, in document order.
+    - `keywords`: per sentence, the cloze candidate words in order.
+    - `term_frequencies`: how often each keyword (lowercased) occurs in the document.
+    """
+
+    def __init__(self, sentences: list[str], keywords: list[list[str]], term_frequencies: dict[str, int]) -> None:
+        self.sentences = sentences
+        self.keywords = keywords
+        self.term_frequencies = term_frequencies
+
+    @classmethod
+    def from_text(cls, text: str) -> "SentenceIndex":
+        cleaned = re.sub(r"\s+", " ", text).strip()
+        sentences = [s.strip() for s in SENTENCE_SPLIT.split(cleaned) if s.strip()] if cleaned else []
+        keywords = [KEYWORD_PATTERN.findall(sentence) for sentence in sentences]
+        term_frequencies = Counter(word.lower() for words in keywords for word in words)
+        return cls(sentences, keywords, dict(term_frequencies))
+
+    @classmethod
+    def from_json(cls, data: str) -> "SentenceIndex":
+        raw = json.loads(data)
+        return cls(raw["sentences"], raw["keywords"], raw["term_frequencies"])
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"sentences": self.sentences, "keywords": self.keywords, "term_frequencies": self.term_frequencies},
+            separators=(",", ":"),
+        )
+
+    def candidates(self, min_chars: int, max_chars: int) -> Iterator[tuple[str, list[str]]]:
+        """(sentence, keywords) for sentences whose length is within the bounds."""
+        for sentence, words in zip(self.sentences, self.keywords):
+            if min_chars <= len(sentence) <= max_chars:
+                yield sentence, words
+
+    def nbytes(self) -> int:
+        # Rough in-memory size of the strings and lists
+        size = sum(len(sentence) + 49 for sentence in self.sentences)
+        size += sum(56 + 8 * len(words) + sum(len(word) + 49 for word in words) for words in self.keywords)
+        size += sum(len(term) + 49 + 28 for term in self.term_frequencies)
+        return size
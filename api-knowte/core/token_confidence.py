@@ -0,0 +1,41 @@
+import torch
+from transformers import LogitsProcessor
+
+
+class TokenConfidence(LogitsProcessor):
+    """
+    Logits processor that scores a greedy `generate` call as it runs.
+
+    At every step it takes the log-probability of the token greedy decoding
+    picks (the argmax) and adds its probability to a per-row running sum,
+    until that row emits EOS. Only O(batch) state is kept — no per-step
+    vocabulary-sized scores (`output_scores`) are stored.
+    Add it last in `logits_processor` so it sees the final scores; scores
+    are passed through unchanged.
+    """
+
+    def __init__(self, eos_token_id: int) -> None:
+        self._eos_token_id = eos_token_id
+        self._prob_sums: torch.Tensor | None = None
+        self._steps: torch.Tensor | None = None
+        self._active: torch.Tensor | None = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        if self._active is None:
+            batch_size = scores.shape[0]
+            self._prob_sums = torch.zeros(batch_size)
+            self._steps = torch.zeros(batch_size)
+            self._active = torch.ones(batch_size, dtype=torch.bool)
+
+        log_probs, chosen = scores.float().log_softmax(dim=-1).max(dim=-1)
+        active = self._active.float()
+        self._prob_sums += log_probs.exp() * active
+        self._steps += active
+        self._active &= chosen != self._eos_token_id
+        return scores
+
+    def confidences(self) -> list[float]:
+        """Mean chosen-token probability per row (0.0 for rows that never ran)."""
+        if self._steps is None:
+            return []
+        return (self._prob_sums / self._steps.clamp(min=1)).tolist()
@@ -0,0 +1,82 @@
+import hashlib
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from types import TracebackType
+
+from fastapi import HTTPException, UploadFile, status
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # 1MB
+
+
+class SpooledUpload:
+    """
+    Streams an `UploadFile` into a temp file in fixed-size chunks.
+
+    - Aborts with 413 as soon as more than `max_bytes` have been read.
+    - Hashes the content (SHA-256) while it streams.
+    - `commit(path)` atomically renames the temp file into place; if the
+      upload is never committed the temp file is removed on exit.
+
+    Usage:
+        with SpooledUpload(file, content_dir, MAX_UPLOAD_BYTES) as upload:
+            upload.commit(content_dir / f"{upload.sha256}.pdf")
+    """
+
+    def __init__(self, file: UploadFile, directory: Path, max_bytes: int) -> None:
+        self._file = file
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._temp_path: Path | None = None
+        self.size = 0
+        self.sha256 = ""
+
+    def __enter__(self) -> "SpooledUpload":
+        digest = hashlib.sha256()
+        try:
+            # Temp file in the same directory so the final rename stays atomic
+            with NamedTemporaryFile(dir=self._directory, suffix=".part", delete=False) as temp:
+                self._temp_path = Path(temp.name)
+                while chunk := self._file.file.read(UPLOAD_CHUNK_BYTES):
+                    self.size += len(chunk)
+                    if self.size > self._max_bytes:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"File too large. Max size is {self._max_bytes // (1024 * 1024)}MB.",
+                        )
+                    digest.update(chunk)
+                    temp.write(chunk)
+        except BaseException:
+            # Only once the temp file is closed — Windows cannot delete an open file
+            self._discard()
+            raise
+        finally:
+            self._file.file.close()
+
+        self.sha256 = digest.hexdigest()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._discard()
+
+    @property
+    def path(self) -> Path:
+        if self._temp_path is None:
+            raise RuntimeError("Upload is not spooled.")
+        return self._temp_path
+
+    def commit(self, destination: Path) -> Path:
+        """Atomically move the spooled file to `destination`."""
+        os.replace(self.path, destination)
+        self._temp_path = None
+        return destination
+
+    def _discard(self) -> None:
+        if self._temp_path is not None:
+            self._temp_path.unlink(missing_ok=True)
+            self._temp_path = None
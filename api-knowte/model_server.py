@@ -0,0 +1,47 @@
+"""
+Donut model server: one process loads Donut and answers the questions of
+every API worker on the node, so workers do not each load their own copy.
+
+Usage (from `api-knowte`):
+
+    python model_server.py --socket data/donut.sock
+    DONUT_SERVER_SOCKET=data/donut.sock uvicorn app:app --workers 4
+
+The server uses the same settings as the API (inference mode, slots,
+batching, memory budget, page format).
+"""
+
+import argparse
+from pathlib import Path
+
+from config import settings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--socket",
+        default=settings.donut_server_socket or "data/donut.sock",
+        help="Unix socket path, relative to api-knowte/ (default: DONUT_SERVER_SOCKET or data/donut.sock)",
+    )
+    args = parser.parse_args()
+
+    # Imported here, not at the top: spawned ingest processes re-run this
+    # script's top-level imports and would each load torch/transformers
+    from core.model_server import ModelServer
+    from services.documentservice import DocumentService
+
+    socket_path = Path(args.socket)
+    if not socket_path.is_absolute():
+        socket_path = Path(__file__).resolve().parent / socket_path
+
+    # Runs Donut in this process — workers reach it through the socket
+    service = DocumentService()
+    service.start_model_loading()
+    with ModelServer(socket_path, service) as server:
+        print(f"Donut model server listening on {socket_path}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
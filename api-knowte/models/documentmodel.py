@@ -1,17 +1,65 @@
 from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Literal
 from uuid import uuid4
 
+from core.page_index import PageIndex
+from core.sentence_index import SentenceIndex
+
+# processing: uploaded, text extraction still running in the background
+# ready: text extracted, pages can be asked about
+# failed: extraction failed, see `error`
+DocumentStatus = Literal["processing", "ready", "failed"]
+
+
+@dataclass(slots=True)
+class DocumentContent:
+    """
+    Ingested artifacts of one unique PDF, shared by every upload of the same bytes.
+
+    Notes:
+    - `content_hash` is the SHA-256 of the PDF; the file lives at `data/contents/{file_name}`.
+    - `ref_count` counts the `Document`s pointing here; the content is dropped at zero.
+    """
+
+    content_hash: str
+    page_count: int = 0
+    # extracted_text: (fallback for phi3)
+    extracted_text: str = ""
+    # page_texts: extracted text per page, index 0 = page 1
+    page_texts: list[str] = field(default_factory=list)
+    # page_index: BM25 index over page_texts, built at ingest — routes page-less questions
+    page_index: PageIndex | None = None
+    # sentence_index: sentences + cloze keywords of extracted_text — flashcard/quiz fallbacks
+    sentence_index: SentenceIndex | None = None
+    status: DocumentStatus = "processing"
+    pages_processed: int = 0
+    error: str | None = None
+    ref_count: int = 0
+    # file_name: "{content_hash}.{ingest id}.pdf" — a new name per ingest, so
+    # dropping this content never deletes the file of a newer upload of it
+    file_name: str = ""
+    # answers: cached Donut answers — key: (page, question), value: (answer, confidence)
+    answers: dict[tuple[int, str], tuple[str, float]] = field(default_factory=dict)
+    # template_answers: Donut answers to the prompt-independent flashcard
+    # templates — key: (page, template); kept for the content's lifetime
+    template_answers: dict[tuple[int, str], str] = field(default_factory=dict)
+    # flashcards: cached decks — key: (prompt, count)
+    flashcards: dict[tuple[str, int], list[tuple[str, str]]] = field(default_factory=dict)
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    # updated_at: last ingest progress or heartbeat from the ingesting worker —
+    # a "processing" row that stops moving was interrupted
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+
 
 @dataclass(slots=True)
 class Document:
-    # id: unique identifier para sa document
+    # id: unique identifier para sa document (per upload)
     id: str = field(default_factory=lambda: str(uuid4()))
     # filename: name ng file na in-upload
     filename: str = ""
-    page_count: int = 0
-    # extracted_text: (fallback for phi3)
-    extracted_text: str = ""
+    # content_hash: points to the shared DocumentContent
+    content_hash: str = ""
     created_at: datetime = field(default_factory=datetime.utcnow)
 
 
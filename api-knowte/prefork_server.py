@@ -0,0 +1,120 @@
+"""
+Preload-before-fork launcher: Donut is loaded once in this master process,
+then the API workers are forked from it and share the weights copy-on-write.
+
+Usage (from `api-knowte`):
+
+    python prefork_server.py --host 127.0.0.1 --port 8000 --workers 4
+
+An alternative to the model server (model_server.py): every worker still
+runs its own inference, but the weights are in RAM once. Plain
+`uvicorn --workers` spawns fresh interpreters instead, so each worker loads
+its own copy. Measure the difference with `benchmarks/worker_memory.py`.
+
+Fork safety:
+- the master loads weights with one torch thread and runs no inference, so
+  no OpenMP pool exists at fork; workers size their own inference slots
+  (DONUT_INFERENCE_SLOTS / DONUT_THREADS_PER_SLOT) and warm up after the fork;
+- the master never opens a PDF or the document store — each worker creates
+  its DocumentService (PyMuPDF render lock, SQLite connections, threads)
+  after the fork;
+- DONUT_INFERENCE_MODE=onnx builds its ONNX Runtime session in each worker.
+
+The ingest pool spawns fresh interpreters that re-run this script's
+top-level imports (as `__mp_main__`), so torch/transformers are only
+imported inside `main()` — otherwise every ingest child loads them too.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+from time import monotonic
+
+import fitz
+import uvicorn
+
+from config import settings
+
+# A worker that dies sooner than this after starting failed to boot (e.g. a
+# bad setting); stop instead of restarting it in a loop
+WORKER_BOOT_SECONDS = 10
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=settings.app_host)
+    parser.add_argument("--port", type=int, default=settings.app_port)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # Imported here, not at the top: see the module docstring
+    from services.documentservice import preload_donut_model
+
+    print(f"Loading Donut before forking {args.workers} workers...")
+    preload_donut_model()
+    # Keep everything loaded so far out of the garbage collector's passes,
+    # which would otherwise write to (and so un-share) those memory pages
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # pid -> when it was started
+    workers: dict[int, float] = {}
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        workers[_fork_worker(sock, args)] = monotonic()
+
+    while workers:
+        pid, _ = os.wait()
+        started_at = workers.pop(pid)
+        if stopping:
+            continue
+        if monotonic() - started_at < WORKER_BOOT_SECONDS:
+            print(f"Worker {pid} failed to start; shutting down")
+            stop(signal.SIGTERM, None)
+            continue
+        print(f"Worker {pid} exited; starting a new one")
+        workers[_fork_worker(sock, args)] = monotonic()
+    sock.close()
+
+
+def _fork_worker(sock: socket.socket, args: argparse.Namespace) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # Worker: uvicorn installs its own signal handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Nothing is rendered before the fork; start from an empty MuPDF store anyway
+    fitz.TOOLS.store_shrink(100)
+    try:
+        config = uvicorn.Config("app:app", host=args.host, port=args.port)
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        sys.stdout.flush()
+        os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi.responses import StreamingResponse
 
 from schemas.documentschema import (
+    DocumentCacheStatsResponse,
+    DocumentInferenceStatsResponse,
     DocumentQuestionRequest,
     DocumentQuestionResponse,
+    DocumentStatusResponse,
     DocumentUploadResponse,
 )
 from services.documentservice import DocumentService, get_document_service
@@ -10,24 +14,60 @@ from services.documentservice import DocumentService, get_document_service
 router = APIRouter(prefix="/document", tags=["document"])
 
 
-@router.post("/upload", response_model=DocumentUploadResponse, status_code=201)
+@router.post("/upload", response_model=DocumentUploadResponse, status_code=202)
 def upload_document(
     file: UploadFile = File(...),
     doc_service: DocumentService = Depends(get_document_service),
 ) -> DocumentUploadResponse:
     """Upload a PDF file.
-    Convert each page to image for Donut.
+    Returns immediately with status "processing" — poll `/status` until "ready".
     """
     return doc_service.upload_document(file)
 
 
+@router.get("/cache/stats", response_model=DocumentCacheStatsResponse)
+def get_document_cache_stats(
+    doc_service: DocumentService = Depends(get_document_service),
+) -> DocumentCacheStatsResponse:
+    """Memory usage and hit/miss counters ng document cache (per worker)."""
+    return doc_service.get_cache_stats()
+
+
+@router.get("/inference/stats", response_model=DocumentInferenceStatsResponse)
+def get_document_inference_stats(
+    doc_service: DocumentService = Depends(get_document_service),
+) -> DocumentInferenceStatsResponse:
+    """Queue depth and slot wait times ng Donut inference (per worker)."""
+    return doc_service.get_inference_stats()
+
+
+@router.get("/{document_id}/status", response_model=DocumentStatusResponse)
+def get_document_status(
+    document_id: str,
+    doc_service: DocumentService = Depends(get_document_service),
+) -> DocumentStatusResponse:
+    """Ingestion status ng document (processing / ready / failed)."""
+    return doc_service.get_status(document_id)
+
+
+@router.get("/{document_id}/status/stream")
+def stream_document_status(
+    document_id: str,
+    doc_service: DocumentService = Depends(get_document_service),
+) -> StreamingResponse:
+    """SSE progress events until the document is ready or failed."""
+    return doc_service.stream_status(document_id)
+
+
 @router.post("/{document_id}/ask", response_model=DocumentQuestionResponse)
 def ask_document(
     document_id: str,
     payload: DocumentQuestionRequest,
     doc_service: DocumentService = Depends(get_document_service),
 ) -> DocumentQuestionResponse:
-    """Magtanong tungkol sa isang page ng na-upload na document."""
+    """Magtanong tungkol sa isang page ng na-upload na document.
+    With `page: null`, the best-matching pages are searched instead.
+    """
     return doc_service.ask_question(document_id, payload.question, payload.page)
 
 
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 
 from schemas.flashcardschema import GenerateFlashcardsRequest, GenerateFlashcardsResponse
 from services.flashcardservice import FlashcardService, get_flashcard_service
@@ -25,3 +26,19 @@ def generate_flashcards(
         prompt=payload.prompt,
         count=payload.count,
     )
+
+
+@router.post("/generate/stream")
+def stream_flashcards(
+    payload: GenerateFlashcardsRequest,
+    flashcard_service: FlashcardService = Depends(get_flashcard_service),
+) -> StreamingResponse:
+    """
+    Same as `/generate`, but streams each flashcard as an SSE event as soon
+    as it is ready; cloze fallback cards come last, then a `done` event.
+    """
+    return flashcard_service.stream_flashcards(
+        document_id=payload.document_id,
+        prompt=payload.prompt,
+        count=payload.count,
+    )
@@ -1,16 +1,32 @@
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
+from models.documentmodel import DocumentStatus
+
 
 class DocumentUploadResponse(BaseModel):
-    # Returned after uploading a document
+    # Returned after uploading a document — text extraction keeps running
+    # in the background while status is "processing"
     document_id: str
     filename: str
     page_count: int
+    status: DocumentStatus
+
+
+class DocumentStatusResponse(BaseModel):
+    document_id: str
+    filename: str
+    status: DocumentStatus
+    page_count: int
+    pages_processed: int
+    error: str | None = None
 
 
 class DocumentQuestionRequest(BaseModel):
     question: str = Field(min_length=1, max_length=1024)
-    page: int = Field(default=1, ge=1)
+    # null — search the whole document for the best page(s)
+    page: int | None = Field(default=1, ge=1)
 
 
 class DocumentQuestionResponse(BaseModel):
@@ -19,3 +35,37 @@ class DocumentQuestionResponse(BaseModel):
     answer: str
     confidence: float
     model: str
+    # Page the answer came from
+    page: int
+    # extractive: answered from the PDF text layer, donut: answered by the model
+    engine: Literal["extractive", "donut"]
+
+
+class DocumentCacheStatsResponse(BaseModel):
+    # In-memory document cache of the worker that served the request
+    max_bytes: int
+    current_bytes: int
+    entries: int
+    hits: int
+    misses: int
+    evictions: int
+    bytes_by_kind: dict[str, int]
+    # Pages currently held decoded in front of the compact page storage, and
+    # their bytes (within DOCUMENT_DECODED_PAGES_BYTES, outside max_bytes)
+    decoded_pages: int
+    decoded_bytes: int
+
+
+class DocumentInferenceStatsResponse(BaseModel):
+    # Donut inference slots of the worker that served the request
+    slots: int
+    threads_per_slot: int
+    queue_depth: int
+    batcher_queue_depth: int
+    running: int
+    completed: int
+    rejected: int
+    avg_wait_ms: float
+    max_wait_ms: float
+    # Questions answered per engine — the text-layer fast path hit rate
+    answers_by_engine: dict[str, int]
@@ -1,51 +1,262 @@
+from collections import Counter
+from collections.abc import Container, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from datetime import datetime, timedelta
+import json
+import multiprocessing
+import os
 import re
+import sys
+from threading import Condition, Event, Lock, RLock, Thread
+from time import monotonic, sleep, time
 from uuid import uuid4
 
 import fitz  # PyMuPDF — to extract text and convert PDF pages to images
+import numpy as np
 import torch
-from PIL import Image
-from transformers import DonutProcessor, VisionEncoderDecoderModel
+from transformers import DonutProcessor, LogitsProcessorList, VisionEncoderDecoderModel
+from transformers.modeling_outputs import BaseModelOutput
 
 from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import StreamingResponse
 
-from models.documentmodel import Document
+from config import settings
+from core.document_store import DocumentStore
+from core.extractive_qa import answer_from_text
+from core.inference_backend import DonutInferenceBackend
+from core.inference_executor import InferenceExecutor
+from core.memory_cache import MemoryBudgetCache
+from core.micro_batcher import MicroBatcher
+from core.model_server import ModelServerClient
+from core.page_codec import PageCodec
+from core.page_index import PageIndex
+from core.page_preprocess import DonutPagePreprocessor, pixmap_array
+from core.page_render import FIXED_RENDER_ZOOM, RenderProfile
+from core.pdf_extract import extract_page_range, plan_page_shards
+from core.sentence_index import SentenceIndex
+from core.token_confidence import TokenConfidence
+from core.upload_spool import SpooledUpload
+from models.documentmodel import Document, DocumentContent
 from schemas.documentschema import (
+    DocumentCacheStatsResponse,
+    DocumentInferenceStatsResponse,
     DocumentQuestionResponse,
+    DocumentStatusResponse,
     DocumentUploadResponse,
 )
 
-# Folder where uploaded files are saved
-UPLOAD_DIR = Path(__file__).resolve().parent.parent / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Before content PDFs moved next to the store they were kept here, inside
+# the public /uploads static mount; moved out on startup
+LEGACY_UPLOAD_DIR = Path(__file__).resolve().parent.parent / "uploads"
+# Content PDF names back then: "{sha256}.pdf"
+CONTENT_FILE_NAME = re.compile(r"[0-9a-f]{64}\.pdf")
 
 MODEL_NAME = "naver-clova-ix/donut-base-finetuned-docvqa"
+# Reported as `model` when the text layer answered instead of Donut
+EXTRACTIVE_MODEL_NAME = "text-layer-extractive"
 MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB
-MAX_STORED_DOCUMENTS = 20
+# Per shared content — oldest entries are dropped first
+MAX_CACHED_ANSWERS = 256
+MAX_CACHED_FLASHCARD_DECKS = 16
 MAX_TEXT_CHARS = 200_000
 DOCUMENT_TTL_SECONDS = 60 * 60 * 24  # 24 hours
+# The sweeper sleeps until the next expiry, but re-checks at least this often
+# (other workers add documents to the shared store too). It also refreshes
+# `updated_at` of this worker's running ingests, so keep it well under INGEST_STALE_SECONDS.
+EXPIRY_SWEEP_MAX_SLEEP_SECONDS = 60
+# How long ask/flashcards/text wait for a processing document before 409
+DOCUMENT_READY_WAIT_SECONDS = 10
+DOCUMENT_RETRY_AFTER_SECONDS = 2
+# Another worker may be ingesting — re-read the store this often while waiting
+INGEST_POLL_SECONDS = 0.25
+# A "processing" content not refreshed for this long was interrupted (restart/crash):
+# the worker that owns an ingest refreshes it, even while its shards wait in the pool
+INGEST_STALE_SECONDS = 5 * 60
+# Small PDFs stay in one shard — IPC costs more than it saves below this
+MIN_PAGES_PER_SHARD = 8
+# Flashcard questions that do not depend on the user's prompt — their answers
+# are computed once per page and shared by every flashcard request
+FLASHCARD_TEMPLATES = (
+    "What is one important concept from this page?",
+    "What key definition appears on this page?",
+    "What important fact should a student remember from this page?",
+    "What is one likely exam point from this page?",
+)
+# Model-backed routes answer 503 with this Retry-After while Donut is loading
+MODEL_LOADING_RETRY_AFTER_SECONDS = 10
+# How often a worker asks a still-loading model server whether it is ready
+MODEL_SERVER_POLL_SECONDS = 1
 
 
 class DocumentService:
-    def __init__(self) -> None:
-        # In-memory storage 
-        self._documents: dict[str, Document] = {}
-        # Converted page images per document — key: "{doc_id}_{page}"
-        self._page_images: dict[str, Image.Image] = {}
+    def __init__(self, model_server_socket: str | None = None) -> None:
+        # Persistent storage — shared by all workers, survives restarts
+        self._store = DocumentStore(_resolve_store_path(settings.document_store_path))
+        # Content PDFs live next to the store, outside the public /uploads
+        # mount — content-addressed names there would reveal who uploaded what
+        self._content_dir = _resolve_store_path(settings.document_store_path).parent / "contents"
+        self._content_dir.mkdir(parents=True, exist_ok=True)
+        _move_legacy_content_files(self._content_dir)
+        # One LRU over everything a worker keeps in RAM for documents, bounded
+        # by actual bytes — a 300-page textbook weighs what its text, page
+        # images and encoder tensors weigh. Keys:
+        #   ("content", content_hash)                 ready DocumentContent
+        #   ("page", content_hash, page)              rendered page, in DOCUMENT_PAGE_FORMAT
+        #   ("encoder_states", content_hash, page)    Donut encoder output
+        # Pages are rendered on first access; encoder states let
+        # questions on an already-encoded page only pay for decoding.
+        # Grouped by content_hash so dropping a document does not scan the cache.
+        # Its budget is what DOCUMENT_DECODED_PAGES_BYTES leaves of DOCUMENT_MEMORY_BUDGET_BYTES.
+        decoded_budget = min(settings.document_decoded_pages_bytes, settings.document_memory_budget_bytes)
+        self._memory: MemoryBudgetCache[tuple, object] = MemoryBudgetCache(
+            max_bytes=settings.document_memory_budget_bytes - decoded_budget,
+            sizeof=_artifact_nbytes,
+            group=lambda key: key[1],
+        )
+        self._render_profile = RenderProfile(settings.document_render_profile)
+        # Compressed pages are decoded only to be encoded; the last few decoded
+        # pixmaps stay around in a small LRU of their own, sized in real bytes
+        # (a supersampled page is ~57MB of RGB). Keys: (content_hash, page)
+        self._page_codec = PageCodec(settings.document_page_format)
+        self._decoded_pages: MemoryBudgetCache[tuple[str, int], fitz.Pixmap] = MemoryBudgetCache(
+            max_bytes=decoded_budget,
+            sizeof=_pixmap_nbytes,
+            group=lambda key: key[0],
+        )
+        # Notified whenever a local ingest job makes progress
+        self._lock = RLock()
+        self._ingest_progress = Condition(self._lock)
+        # Text extraction runs off the request thread, sharded across worker processes.
+        # Replaced (under its lock) if a child dies and breaks it — see `_submit_shard`.
+        self._ingest_pool = _new_ingest_pool()
+        self._ingest_pool_lock = Lock()
+        # Shards still queued or running in this worker's pool, per content_hash
+        self._pending_shards: Counter[str] = Counter()
+        # PyMuPDF is not thread-safe, render one page at a time
+        self._render_lock = Lock()
+
+        # Donut is loaded on a background thread (`start_model_loading`) so no
+        # request pays for it; model-backed calls get 503 until it is ready
+        self._processor: DonutProcessor | None = None
+        self._preprocessor: DonutPagePreprocessor | None = None
+        # Encoder + generate for the configured DONUT_INFERENCE_MODE; it holds
+        # the only reference to the model (quantized in place for int8)
+        self._backend: DonutInferenceBackend | None = None
+        # Decoder position limit — caps how many tokens `generate` may add
+        self._max_positions: int | None = None
+        # With a model server (DONUT_SERVER_SOCKET), Donut is not loaded in
+        # this process at all — questions go to the server over its socket
+        self._model_client = (
+            ModelServerClient(_resolve_store_path(model_server_socket)) if model_server_socket else None
+        )
+        # (height, width) of Donut's input; pages are rendered for it
+        self._input_size: tuple[int, int] | None = None
+        self._inference_mode: str | None = None
+        self._model_ready = Event()
+        self._model_error: str | None = None
+        self._model_loader: Thread | None = None
+        self._model_loader_lock = Lock()
+        self._answers_by_engine: Counter[str] = Counter()
+
+        # All Donut work (encoder and decoder) runs on these slots instead of
+        # the anyio request threadpool, so it cannot starve other routes
+        self._executor = InferenceExecutor(
+            slots=settings.donut_inference_slots,
+            threads_per_slot=settings.donut_threads_per_slot,
+            max_queued=settings.donut_max_queued,
+            name="donut-inference",
+        )
+        # Concurrent questions wait a few ms and share one generate() call;
+        # one batch per inference slot runs at a time
+        self._batcher: MicroBatcher[tuple[torch.Tensor, str], tuple[str, float]] = MicroBatcher(
+            run_batch=lambda items: self._executor.run(self._run_donut_batch, items),
+            max_batch_size=settings.donut_batch_size,
+            max_wait_ms=settings.donut_batch_wait_ms,
+            name="donut-batcher",
+            workers=settings.donut_inference_slots,
+        )
+
+        # Expired documents are removed in the background, never on the request path
+        self._sweeper_wakeup = Event()
+        self._sweeper = Thread(target=self._sweep_expired_documents, name="document-expiry-sweeper", daemon=True)
+        self._sweeper.start()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._model_ready.is_set()
+
+    def start_model_loading(self) -> None:
+        """
+        Load Donut in the background. Single-flight: while a load is running
+        (or once it succeeded) further calls do nothing.
+        """
+        with self._model_loader_lock:
+            if self._model_ready.is_set() or self._model_loader is not None:
+                return
+            self._model_error = None
+            self._model_loader = Thread(target=self._load_model, name="donut-loader", daemon=True)
+            self._model_loader.start()
+
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        """Start loading if needed and block until the load finishes (or the timeout passes)."""
+        self.start_model_loading()
+        loader = self._model_loader
+        if loader is not None:
+            loader.join(timeout)
+        return self._model_ready.is_set()
+
+    def get_readiness(self) -> dict[str, str]:
+        if self._model_ready.is_set():
+            return {"status": "ready", "model": MODEL_NAME, "inference_mode": self._inference_mode}
+        if self._model_error is not None:
+            return {"status": "failed", "model": MODEL_NAME, "error": self._model_error}
+        return {"status": "loading", "model": MODEL_NAME}
 
-        # Load the Donut model and processor — takes a while to download initially
-        self._processor = DonutProcessor.from_pretrained(MODEL_NAME)
-        self._model = VisionEncoderDecoderModel.from_pretrained(MODEL_NAME)
-        self._model.eval()  # Evaluation mode — no training, only inference
+    def model_input_size(self) -> tuple[int, int] | None:
+        return self._input_size
+
+    def serve_page_questions(
+        self,
+        content_hash: str,
+        pairs: list[tuple[int, str]],
+        renders: dict[int, bytes],
+    ) -> tuple[list[tuple[str, float]], list[int]]:
+        """
+        Model-server side of a worker's Donut questions: (answers, []) or,
+        when this process has neither a page nor its encoder states,
+        ([], pages whose PNG renders the worker has to send first).
+        """
+        self._require_model()
+        if renders:
+            with self._render_lock:
+                stored = {page: self._page_codec.compact(rendered) for page, rendered in renders.items()}
+            for page, value in stored.items():
+                self._memory.put(("page", content_hash, page), value)
+
+        missing = [
+            page
+            for page in sorted({page for page, _ in pairs})
+            if page not in renders
+            and self._memory.get(("encoder_states", content_hash, page)) is None
+            and self._memory.get(("page", content_hash, page)) is None
+        ]
+        if missing:
+            return [], missing
+        return self._donut_answers(content_hash, pairs), []
 
     def upload_document(self, file: UploadFile) -> DocumentUploadResponse:
         """
         Upload a PDF file.
-        Save to disk, convert each page to image for Donut,
-        and extract the text for fallback (phi3).
+        Save to disk and return right away with status "processing";
+        the text for fallback (phi3) is extracted in page shards across the
+        ingest process pool and merged back in page order.
+        Page images for Donut are rendered later, on first access.
+
+        Files are content-addressed: re-uploading a PDF that is already
+        stored only adds a new `document_id` pointing at the shared content.
         """
-        self._cleanup_expired_documents()
         if not file.filename or not file.filename.lower().endswith(".pdf"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -57,140 +268,148 @@ class DocumentService:
                 detail="Invalid file type. Please upload a PDF.",
             )
 
-        doc_id = str(uuid4())
-        file_bytes = file.file.read()
-        if len(file_bytes) > MAX_UPLOAD_BYTES:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File too large. Max size is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB.",
-            )
-
-        save_path = UPLOAD_DIR / f"{doc_id}.pdf"
-        save_path.write_bytes(file_bytes)
-
-        pdf = fitz.open(stream=file_bytes, filetype="pdf")
-        page_count = len(pdf)
-        extracted_text_chunks: list[str] = []
-
-        for page_num in range(page_count):
-            page = pdf[page_num]
-
-            # Fallback for phi3
-            extracted_text_chunks.append(page.get_text())
-
-            # zoom=2 para mas malinaw yung image na nakuha angas (mas accurate si Donut)
-            mat = fitz.Matrix(2, 2)
-            pix = page.get_pixmap(matrix=mat)
-            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
-            self._page_images[f"{doc_id}_{page_num + 1}"] = img
-
-        pdf.close()
-        file.file.close()
-
-        extracted_text = "\n".join(extracted_text_chunks).strip()[:MAX_TEXT_CHARS]
+        # Streamed to disk in chunks — oversized uploads are cut off at the limit.
+        # No service lock here: the store's transactions make create/add atomic
+        # across workers, and this file I/O must not stall asks or ingest callbacks.
+        with SpooledUpload(file, self._content_dir, MAX_UPLOAD_BYTES) as upload:
+            document = Document(filename=file.filename, content_hash=upload.sha256)
+            # Retry once: the content can be dropped by another worker in between
+            for _ in range(2):
+                content = self._store.get_content(upload.sha256)
+                if content is None or content.status == "failed":
+                    content = self._create_content(upload)
+                if self._store.add_document(document, DOCUMENT_TTL_SECONDS):
+                    self._sweeper_wakeup.set()  # re-plan in case the sweeper has nothing scheduled
+                    break
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Upload conflicted with a concurrent delete. Please retry.",
+                )
 
-        document = Document(
-            id=doc_id,
-            filename=file.filename,
-            page_count=page_count,
-            extracted_text=extracted_text,
+        return DocumentUploadResponse(
+            document_id=document.id,
+            filename=document.filename,
+            page_count=content.page_count,
+            status=content.status,
         )
-        self._evict_if_needed()
-        self._documents[doc_id] = document
 
-        return DocumentUploadResponse(
-            document_id=doc_id,
-            filename=file.filename,
-            page_count=page_count,
+    def get_status(self, document_id: str) -> DocumentStatusResponse:
+        """
+        Report where a document is in background ingestion.
+        """
+        document = self._get_document(document_id)
+        return self._status_response(document, self._get_content_row(document.content_hash))
+
+    def stream_status(self, document_id: str) -> StreamingResponse:
+        """
+        SSE stream of ingestion progress; ends once the document is ready or failed.
+        """
+        self.get_status(document_id)
+        return StreamingResponse(
+            self._stream_status(document_id),
+            media_type="text/event-stream",
         )
 
-    def ask_question(self, document_id: str, question: str, page: int) -> DocumentQuestionResponse:
+    def ask_question(self, document_id: str, question: str, page: int | None) -> DocumentQuestionResponse:
         """
         Ask a question about a page of the document.
         Uses the page image to answer the question.
-        """
-        self._cleanup_expired_documents()
-        if document_id not in self._documents:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Document not found.",
-            )
 
-        document = self._documents[document_id]
-        if page > document.page_count:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Page {page} wala — ang document ay {document.page_count} page(s) lang.",
-            )
+        Without a page, the page index ranks pages by the question's terms,
+        Donut runs on the top `DOCUMENT_ASK_TOP_PAGES` and the most
+        confident answer wins.
 
-        image_key = f"{document_id}_{page}"
-        image = self._page_images.get(image_key)
-        if image is None:
+        The text layer is tried first: an extractive answer scoring at least
+        `EXTRACTIVE_QA_THRESHOLD` is returned without running Donut.
+        """
+        content = self._get_ready_content(document_id)
+        if page is None:
+            pages = self._candidate_pages(content, question)
+        elif page > content.page_count:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Page image not loaded.",
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Page {page} wala — ang document ay {content.page_count} page(s) lang.",
             )
+        else:
+            pages = [page]
 
-        answer, confidence = self._run_donut(image, question)
+        extracted = self._answer_from_text(content, question, pages)
+        if extracted is not None:
+            best_page, answer, confidence = extracted
+            engine, model = "extractive", EXTRACTIVE_MODEL_NAME
+        else:
+            # Scanned pages or no confident span — ask Donut
+            self._require_model()
+            answers = self._answer_pages(content, question, pages)
+            best_page = max(answers, key=lambda candidate: answers[candidate][1])
+            answer, confidence = answers[best_page]
+            engine, model = "donut", MODEL_NAME
 
+        with self._lock:
+            self._answers_by_engine[engine] += 1
         return DocumentQuestionResponse(
             document_id=document_id,
             question=question,
             answer=answer,
             confidence=confidence,
-            model=MODEL_NAME,
+            model=model,
+            page=best_page,
+            engine=engine,
         )
 
     def get_extracted_text(self, document_id: str) -> str:
         """
         Get the plain text of the document. Can be passed to phi3 for chat.
         """
-        self._cleanup_expired_documents()
-        if document_id not in self._documents:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Document not found.",
-            )
-        return self._documents[document_id].extracted_text
+        return self._get_ready_content(document_id).extracted_text
+
+    def get_sentence_index(self, document_id: str) -> SentenceIndex:
+        """
+        Sentences and cloze keywords of the document, built at ingest.
+        """
+        return self._get_ready_content(document_id).sentence_index
 
     def generate_flashcards(self, document_id: str, prompt: str, count: int) -> list[tuple[str, str]]:
         """
         Generate flashcards using the loaded transformer model (Donut) and
         fallback text heuristics from extracted document text.
         """
-        self._cleanup_expired_documents()
-        if document_id not in self._documents:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Document not found.",
-            )
+        return list(self.iter_flashcards(document_id, prompt, count))
 
-        document = self._documents[document_id]
-        if not document.extracted_text.strip():
+    def iter_flashcards(self, document_id: str, prompt: str, count: int) -> Iterator[tuple[str, str]]:
+        """
+        Same as `generate_flashcards`, but yields each card as soon as it is
+        produced and deduplicated (cloze fallback cards come last).
+        The document and model are checked before the iterator is returned,
+        so those errors surface as normal HTTP errors.
+        """
+        self._require_model()
+        content = self._get_ready_content(document_id)
+        if not content.extracted_text.strip():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Document has no extracted text to generate flashcards from.",
             )
+        return self._iter_flashcards(content, prompt, count)
+
+    def _iter_flashcards(self, content: DocumentContent, prompt: str, count: int) -> Iterator[tuple[str, str]]:
+        deck_key = (prompt.strip(), count)
+        cached_deck = content.flashcards.get(deck_key)
+        if cached_deck is not None:
+            yield from list(cached_deck)
+            return
 
         cards: list[tuple[str, str]] = []
         seen_pairs: set[tuple[str, str]] = set()
 
         question_templates = self._flashcard_prompts(prompt)
+        # Bounds Donut runs — answers already cached per page are free
         max_attempts = min(max(count * 4, 12), 80)
-        attempts = 0
 
         # Primary strategy: use Donut page VQA outputs as answers.
-        for page in range(1, document.page_count + 1):
-            image = self._page_images.get(f"{document_id}_{page}")
-            if image is None:
-                continue
-
-            for template in question_templates:
-                if attempts >= max_attempts or len(cards) >= count:
-                    break
-
-                attempts += 1
-                answer, _ = self._run_donut(image, template)
+        if count > 0:
+            for template, answer in self._flashcard_answers(content, question_templates, max_attempts):
                 answer = self._clean_flashcard_text(answer, max_len=300)
                 if len(answer) < 8:
                     continue
@@ -202,13 +421,13 @@ class DocumentService:
 
                 seen_pairs.add(pair)
                 cards.append(pair)
-
-            if len(cards) >= count:
-                break
+                yield pair
+                if len(cards) >= count:
+                    break
 
         # Fallback strategy: derive cloze-style cards from extracted sentences.
         if len(cards) < count:
-            for question, answer in self._fallback_sentence_cards(document.extracted_text):
+            for question, answer in self._fallback_sentence_cards(content.sentence_index):
                 if len(cards) >= count:
                     break
                 pair = (
@@ -219,30 +438,216 @@ class DocumentService:
                     continue
                 seen_pairs.add(pair)
                 cards.append(pair)
+                yield pair
+
+        # Only complete decks are cached — a stream the client dropped stops early
+        with self._lock:
+            _remember(content.flashcards, deck_key, list(cards), MAX_CACHED_FLASHCARD_DECKS)
+            self._reaccount_content(content)
+
+    def _candidate_pages(self, content: DocumentContent, question: str) -> list[int]:
+        top_k = max(1, settings.document_ask_top_pages)
+        ranked = content.page_index.rank(question, top_k) if content.page_index is not None else []
+        if not ranked:
+            # No text match (e.g. scanned pages without a text layer) — start from the front
+            return list(range(1, min(top_k, content.page_count) + 1))
+        return [page for page, _ in ranked]
+
+    def _answer_from_text(
+        self,
+        content: DocumentContent,
+        question: str,
+        pages: list[int],
+    ) -> tuple[int, str, float] | None:
+        """Best extractive (page, answer, score) over `pages`, if it clears the threshold."""
+        best: tuple[int, str, float] | None = None
+        for page in pages:
+            if page > len(content.page_texts):
+                continue
+            extracted = answer_from_text(question, content.page_texts[page - 1])
+            if extracted is not None and (best is None or extracted[1] > best[2]):
+                best = (page, extracted[0], extracted[1])
+
+        if best is None or best[2] < settings.extractive_qa_threshold:
+            return None
+        return best
+
+    def _answer_pages(self, content: DocumentContent, question: str, pages: list[int]) -> dict[int, tuple[str, float]]:
+        """
+        (answer, confidence) per page, from the answer cache where possible.
+        Uncached pages share one batched `generate` call.
+        """
+        answers: dict[int, tuple[str, float]] = {}
+        missing: list[int] = []
+        for page in pages:
+            cached = content.answers.get((page, question.strip()))
+            if cached is not None:
+                answers[page] = cached
+            else:
+                missing.append(page)
+        if not missing:
+            return answers
+
+        results = self._donut_answers(content.content_hash, [(page, question) for page in missing])
+
+        with self._lock:
+            for page, result in zip(missing, results):
+                answers[page] = result
+                _remember(content.answers, (page, question.strip()), result, MAX_CACHED_ANSWERS)
+            self._reaccount_content(content)
+        return answers
+
+    def _reaccount_content(self, content: DocumentContent) -> None:
+        # Caller holds self._lock: sizing walks the answer/deck dicts that
+        # other request threads add to under the same lock
+        self._memory.put(("content", content.content_hash), content)
+
+    def _donut_answers(self, content_hash: str, pairs: list[tuple[int, str]]) -> list[tuple[str, float]]:
+        """
+        (answer, confidence) for each (page, question) pair, from the local
+        model or the model server. Several pairs share one `generate` call;
+        a single one joins concurrent questions in the micro-batcher.
+        """
+        if self._model_client is not None:
+            return self._model_client.answer(content_hash, pairs, lambda page: self._page_render(content_hash, page))
 
-        return cards[:count]
+        encoder_states = self._encode_pages(content_hash, sorted({page for page, _ in pairs}))
+        items = [(encoder_states[page], question) for page, question in pairs]
+        if len(items) == 1:
+            return [self._run_donut(*items[0])]
+        return self._executor.run(self._run_donut_batch, items)
+
+    def _require_model(self) -> None:
+        if self._model_ready.is_set():
+            return
+
+        # Also retries a load that failed earlier
+        self.start_model_loading()
+        detail = "Document model is still loading. Try again shortly."
+        if self._model_error is not None:
+            detail = f"Document model failed to load: {self._model_error}"
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(MODEL_LOADING_RETRY_AFTER_SECONDS)},
+        )
+
+    def _load_model(self) -> None:
+        # Runs on the "donut-loader" thread
+        try:
+            if self._model_client is not None:
+                self._wait_for_model_server()
+            else:
+                self._load_local_model()
+        except Exception as exc:
+            self._model_error = str(exc) or exc.__class__.__name__
+        else:
+            self._model_ready.set()
+        finally:
+            with self._model_loader_lock:
+                self._model_loader = None
+
+    def _load_local_model(self) -> None:
+        # Preloaded before this worker was forked (prefork_server.py), or loaded now
+        if _preloaded_donut is not None:
+            processor, model, backend = _preloaded_donut
+        else:
+            (processor, model), backend = _load_donut(), None
+        # ONNX Runtime sessions own threads, so the onnx backend is never preloaded
+        self._backend = backend or _build_backend(model)
+        self._processor = processor
+        self._preprocessor = DonutPagePreprocessor.from_image_processor(processor.image_processor)
+        self._input_size = (self._preprocessor.height, self._preprocessor.width)
+        self._inference_mode = self._backend.mode
+        self._max_positions = model.decoder.config.max_position_embeddings
+        if settings.donut_warmup:
+            self._warm_up_model()
+
+    def _wait_for_model_server(self) -> None:
+        # Donut lives in the model server process; wait until it has loaded it
+        while True:
+            info = self._model_client.info()
+            readiness = info["readiness"]
+            if readiness["status"] == "ready":
+                break
+            if readiness["status"] == "failed":
+                raise RuntimeError(f"Model server failed to load Donut: {readiness['error']}")
+            sleep(MODEL_SERVER_POLL_SECONDS)
+        self._input_size = tuple(info["input_size"])
+        self._inference_mode = readiness["inference_mode"]
+
+    def _warm_up_model(self) -> None:
+        # One dummy inference on a blank page so the first real question
+        # does not pay for lazy kernel/allocator initialization
+        blank_page = np.full((self._preprocessor.height, self._preprocessor.width, 3), 255, dtype=np.uint8)
+        encoder_states = self._executor.run(self._encode_pixels, [blank_page])
+        self._executor.run(self._run_donut_batch, [(encoder_states, "What is the title?")])
 
     def _flashcard_prompts(self, user_prompt: str) -> list[str]:
         prompt_hint = user_prompt.strip()[:120]
-        return [
-            f"Based on this page, {prompt_hint}",
-            "What is one important concept from this page?",
-            "What key definition appears on this page?",
-            "What important fact should a student remember from this page?",
-            "What is one likely exam point from this page?",
-        ]
+        return [f"Based on this page, {prompt_hint}", *FLASHCARD_TEMPLATES]
 
-    def _fallback_sentence_cards(self, text: str) -> list[tuple[str, str]]:
-        cleaned = re.sub(r"\s+", " ", text).strip()
-        if not cleaned:
-            return []
+    def _flashcard_answers(
+        self,
+        content: DocumentContent,
+        question_templates: list[str],
+        max_attempts: int,
+    ) -> Iterator[tuple[str, str]]:
+        """
+        (template, answer) candidates for a deck, lazily: every cached
+        template answer first, then Donut on up to `max_attempts` uncached
+        (page, template) pairs, `DONUT_BATCH_SIZE` per batched call.
+        """
+        self._refresh_template_answers(content)
+        template_indexes = {template: index for index, template in enumerate(question_templates)}
+        with self._lock:
+            cached = sorted(
+                ((template_indexes[template], page), answer)
+                for (page, template), answer in content.template_answers.items()
+                if template in template_indexes and page <= content.page_count
+            )
+        # Round by round like the plan: first template on every page, then the next
+        for (template_index, _), answer in cached:
+            yield question_templates[template_index], answer
 
-        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", cleaned) if s.strip()]
-        candidates = [s for s in sentences if 40 <= len(s) <= 220]
+        plan = _plan_flashcard_pairs(
+            content.page_count,
+            len(question_templates),
+            max_attempts,
+            cached={(page, template_index) for (template_index, page), _ in cached},
+        )
+        batch_size = max(1, settings.donut_batch_size)
+        for start in range(0, len(plan), batch_size):
+            pairs = [(page, question_templates[index]) for page, index in plan[start : start + batch_size]]
+            for (_, template), answer in zip(pairs, self._answer_templates(content, pairs)):
+                yield template, answer
 
+    def _answer_templates(self, content: DocumentContent, pairs: list[tuple[int, str]]) -> list[str]:
+        """
+        Donut answers for (page, template) pairs in one batched `generate` call.
+        Answers to the fixed templates are remembered per page.
+        """
+        answers = [answer for answer, _ in self._donut_answers(content.content_hash, pairs)]
+        for (page, template), answer in zip(pairs, answers):
+            if template in FLASHCARD_TEMPLATES:
+                self._remember_template_answer(content, page, template, answer)
+        return answers
+
+    def _refresh_template_answers(self, content: DocumentContent) -> None:
+        # Answers other workers stored since this content was loaded — one read per deck
+        stored = self._store.get_template_answers(content.content_hash)
+        with self._lock:
+            content.template_answers.update(stored)
+            self._reaccount_content(content)
+
+    def _remember_template_answer(self, content: DocumentContent, page: int, template: str, answer: str) -> None:
+        with self._lock:
+            content.template_answers[(page, template)] = answer
+        self._store.put_template_answer(content.content_hash, page, template, answer)
+
+    def _fallback_sentence_cards(self, sentence_index: SentenceIndex) -> list[tuple[str, str]]:
         cards: list[tuple[str, str]] = []
-        for sentence in candidates:
-            words = re.findall(r"[A-Za-z][A-Za-z0-9\-]{4,}", sentence)
+        for sentence, words in sentence_index.candidates(40, 220):
             if not words:
                 continue
             keyword = max(words, key=len)
@@ -258,95 +663,680 @@ class DocumentService:
         text = re.sub(r"\s+", " ", (value or "")).strip()
         return text[:max_len]
 
-    def _evict_if_needed(self) -> None:
-        while len(self._documents) >= MAX_STORED_DOCUMENTS:
-            oldest_id = next(iter(self._documents))
-            self._delete_document(oldest_id)
+    def _create_content(self, upload: SpooledUpload) -> DocumentContent:
+        """
+        Store a newly seen PDF under its content hash and start ingesting it.
+        If another upload/worker registered it first, return that content instead.
+        """
+        # A fresh file per ingest: a concurrent drop of an older ingest of the
+        # same PDF removes its own file, never this one
+        file_name = f"{upload.sha256}.{uuid4().hex}.pdf"
+        save_path = upload.commit(self._content_dir / file_name)
+
+        # Opening only reads the page tree — cheap enough for the request thread
+        try:
+            with self._render_lock, fitz.open(save_path) as pdf:
+                page_count = len(pdf)
+        except Exception as exc:
+            save_path.unlink(missing_ok=True)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Could not read the PDF file.",
+            ) from exc
+
+        content = DocumentContent(content_hash=upload.sha256, page_count=page_count, file_name=file_name)
+        created, replaced_file = self._store.create_content(content)
+        if not created:
+            save_path.unlink(missing_ok=True)
+            return self._get_content_row(content.content_hash)
+        if replaced_file is not None:
+            # Left by an ingest that failed
+            (self._content_dir / replaced_file).unlink(missing_ok=True)
+
+        shards = plan_page_shards(page_count, settings.document_ingest_workers, MIN_PAGES_PER_SHARD)
+        if not shards:
+            self._finish_ingest(content.content_hash, file_name)
+        with self._lock:
+            self._pending_shards[content.content_hash] += len(shards)
+        for index, (start, stop) in enumerate(shards):
+            try:
+                self._submit_shard(content.content_hash, save_path, start, stop)
+            except Exception as exc:
+                # Shards already submitted finish through their callbacks; the rest never will
+                self._release_shards(content.content_hash, len(shards) - index)
+                self._store.mark_failed(content.content_hash, str(exc) or exc.__class__.__name__)
+                with self._ingest_progress:
+                    self._ingest_progress.notify_all()
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Text extraction is unavailable. Please retry.",
+                    headers={"Retry-After": str(DOCUMENT_RETRY_AFTER_SECONDS)},
+                ) from exc
+        return content
+
+    def _submit_shard(self, content_hash: str, save_path: Path, start: int, stop: int) -> None:
+        pool = self._ingest_pool
+        try:
+            future = pool.submit(extract_page_range, str(save_path), start, stop)
+        except BrokenProcessPool:
+            # A child of this pool died earlier (MuPDF crash, OOM kill) — retry on a fresh pool
+            pool = self._replace_ingest_pool(pool)
+            future = pool.submit(extract_page_range, str(save_path), start, stop)
+        future.add_done_callback(
+            lambda done: self._finish_shard(content_hash, save_path.name, start, stop, done, pool)
+        )
+
+    def _replace_ingest_pool(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        # Single-flight: whoever sees the broken pool first replaces it
+        with self._ingest_pool_lock:
+            if self._ingest_pool is broken:
+                self._ingest_pool = _new_ingest_pool()
+                broken.shutdown(wait=False, cancel_futures=True)
+            return self._ingest_pool
+
+    def _release_shards(self, content_hash: str, count: int) -> None:
+        with self._lock:
+            self._pending_shards[content_hash] -= count
+            if self._pending_shards[content_hash] <= 0:
+                del self._pending_shards[content_hash]
+
+    def _get_document(self, document_id: str) -> Document:
+        document = self._store.get_document(document_id)
+        if document is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found.",
+            )
+        return document
+
+    def _get_content_row(self, content_hash: str) -> DocumentContent:
+        """
+        Current content metadata from the store (status, progress, text).
+        Marks ingests that stopped making progress as failed.
+        """
+        content = self._store.get_content(content_hash)
+        if content is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found.",
+            )
+        stale_before = datetime.utcnow() - timedelta(seconds=INGEST_STALE_SECONDS)
+        if content.status == "processing" and content.updated_at < stale_before:
+            content.error = "Processing was interrupted. Please upload the file again."
+            content.status = "failed"
+            self._store.mark_failed(content_hash, content.error)
+        return content
+
+    def _load_content(self, content_hash: str) -> DocumentContent:
+        """
+        Return the in-memory content, loading it from the store once it is ready.
+        Contents still processing are returned as a store snapshot and not cached.
+        """
+        content = self._memory.get(("content", content_hash))
+        if content is not None:
+            # Another worker may have dropped this PDF (and it was uploaded
+            # again, as a new ingest with its own file) since it was cached
+            if self._store.get_content_file_name(content_hash) == content.file_name:
+                return content
+            self._memory.discard_group(content_hash)
+            self._decoded_pages.discard_group(content_hash)
+
+        content = self._get_content_row(content_hash)
+        if content.status != "ready":
+            return content
+
+        content.page_texts = self._store.get_page_texts(content_hash)
+        page_index = self._store.get_page_index(content_hash)
+        # Contents ingested before the page index existed get one built on load
+        if page_index is not None:
+            content.page_index = PageIndex.from_json(page_index)
+        else:
+            content.page_index = PageIndex.from_page_texts(content.page_texts)
+        content.template_answers = self._store.get_template_answers(content_hash)
+        sentence_index = self._store.get_sentence_index(content_hash)
+        if sentence_index is not None:
+            content.sentence_index = SentenceIndex.from_json(sentence_index)
+        else:
+            content.sentence_index = SentenceIndex.from_text(content.extracted_text)
+        self._memory.put(("content", content_hash), content)
+        return content
+
+    def _get_ready_content(self, document_id: str) -> DocumentContent:
+        """
+        Return the shared content of a document whose text is extracted.
+        Waits briefly for documents still processing (here or in another
+        worker), then rejects with 409.
+        """
+        document = self._get_document(document_id)
+        deadline = monotonic() + DOCUMENT_READY_WAIT_SECONDS
+        while True:
+            content = self._load_content(document.content_hash)
+            remaining = deadline - monotonic()
+            if content.status != "processing" or remaining <= 0:
+                break
+            with self._ingest_progress:
+                self._ingest_progress.wait(timeout=min(INGEST_POLL_SECONDS, remaining))
+
+        if content.status == "processing":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Document is still processing. Try again shortly.",
+                headers={"Retry-After": str(DOCUMENT_RETRY_AFTER_SECONDS)},
+            )
+        if content.status == "failed":
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Document processing failed: {content.error}",
+            )
+        return content
+
+    def _finish_shard(
+        self,
+        content_hash: str,
+        file_name: str,
+        start: int,
+        stop: int,
+        future: Future,
+        pool: ProcessPoolExecutor,
+    ) -> None:
+        # Runs on the process pool's callback thread once a page shard is done
+        self._release_shards(content_hash, 1)
+        try:
+            page_texts: list[str] = future.result()
+        except Exception as exc:
+            if isinstance(exc, BrokenProcessPool):
+                # Every shard still in that pool fails with it; later uploads get a new one
+                self._replace_ingest_pool(pool)
+            self._store.mark_failed(content_hash, str(exc) or exc.__class__.__name__)
+            with self._ingest_progress:
+                self._ingest_progress.notify_all()
+            return
+
+        pages_processed, page_count = self._store.save_page_texts(content_hash, file_name, start, page_texts)
+        if pages_processed >= page_count >= 0:
+            self._finish_ingest(content_hash, file_name)
+        with self._ingest_progress:
+            self._ingest_progress.notify_all()
+
+    def _finish_ingest(self, content_hash: str, file_name: str) -> None:
+        page_texts = self._store.get_page_texts(content_hash)
+        extracted_text = "\n".join(page_texts).strip()[:MAX_TEXT_CHARS]
+        page_index = PageIndex.from_page_texts(page_texts)
+        sentence_index = SentenceIndex.from_text(extracted_text)
+        self._store.mark_ready(content_hash, file_name, extracted_text, page_index.to_json(), sentence_index.to_json())
+        with self._ingest_progress:
+            self._ingest_progress.notify_all()
+
+    def _stream_status(self, document_id: str):
+        last_event = None
+        while True:
+            # The current status goes out first, without waiting for progress
+            if last_event is not None:
+                with self._ingest_progress:
+                    self._ingest_progress.wait(timeout=INGEST_POLL_SECONDS)
+
+            document = self._store.get_document(document_id)
+            content = self._store.get_content(document.content_hash) if document is not None else None
+            if document is None or content is None:
+                yield f"data: {json.dumps({'document_id': document_id, 'error': 'Document not found.'})}\n\n"
+                return
+
+            response = self._status_response(document, content)
+            event = response.model_dump_json()
+            if event != last_event:
+                yield f"data: {event}\n\n"
+                last_event = event
+            if response.status != "processing":
+                return
+
+    def _status_response(self, document: Document, content: DocumentContent) -> DocumentStatusResponse:
+        return DocumentStatusResponse(
+            document_id=document.id,
+            filename=document.filename,
+            status=content.status,
+            page_count=content.page_count,
+            pages_processed=content.pages_processed,
+            error=content.error,
+        )
+
+    def get_cache_stats(self) -> DocumentCacheStatsResponse:
+        """
+        Current in-memory usage of this worker's document cache.
+        """
+        usage = self._memory.usage_by(lambda key: key[0])
+        return DocumentCacheStatsResponse(
+            max_bytes=self._memory.max_bytes,
+            current_bytes=self._memory.current_bytes,
+            entries=len(self._memory),
+            hits=self._memory.hits,
+            misses=self._memory.misses,
+            evictions=self._memory.evictions,
+            bytes_by_kind={str(kind): size for kind, size in usage.items()},
+            decoded_pages=len(self._decoded_pages),
+            decoded_bytes=self._decoded_pages.current_bytes,
+        )
+
+    def _sweep_expired_documents(self) -> None:
+        """
+        Background loop: delete expired documents, then sleep until the next
+        one expires (or a new upload wakes it). Both steps are index lookups on
+        `expires_at` in the store; expired documents are already hidden from
+        reads in the meantime. Each pass also marks this worker's ingests as
+        alive, so a backlogged pool does not make them look interrupted.
+        """
+        while True:
+            try:
+                with self._lock:
+                    ingesting = list(self._pending_shards)
+                if ingesting:
+                    self._store.touch_contents(ingesting)
+                self._cleanup_expired_documents()
+                next_expiry = self._store.next_expiry()
+            except Exception:
+                # Store busy or briefly unavailable — try again on the next tick
+                next_expiry = None
+
+            delay = EXPIRY_SWEEP_MAX_SLEEP_SECONDS
+            if next_expiry is not None:
+                delay = min(delay, max(0.0, next_expiry - time()))
+            self._sweeper_wakeup.wait(delay)
+            self._sweeper_wakeup.clear()
+
+    def get_inference_stats(self) -> DocumentInferenceStatsResponse:
+        """
+        Load on this worker's Donut inference slots — for sizing nodes.
+        """
+        return DocumentInferenceStatsResponse(
+            **self._executor.stats(),
+            batcher_queue_depth=self._batcher.pending,
+            answers_by_engine=dict(self._answers_by_engine),
+        )
 
     def _cleanup_expired_documents(self) -> None:
-        now = datetime.utcnow()
-        expired_ids = [
-            doc_id
-            for doc_id, doc in self._documents.items()
-            if (now - doc.created_at) > timedelta(seconds=DOCUMENT_TTL_SECONDS)
-        ]
-        for doc_id in expired_ids:
-            self._delete_document(doc_id)
+        for content_hash, file_name in self._store.delete_expired():
+            self._drop_content(content_hash, file_name)
 
     def _delete_document(self, document_id: str) -> None:
-        self._documents.pop(document_id, None)
+        dropped = self._store.delete_document(document_id)
+        if dropped is not None:
+            self._drop_content(*dropped)
+
+    def _drop_content(self, content_hash: str, file_name: str) -> None:
+        # The last document referencing this PDF is gone. `file_name` belongs
+        # to the dropped row — a re-upload since then has its own file.
+        self._memory.discard_group(content_hash)
+        self._decoded_pages.discard_group(content_hash)
+        (self._content_dir / file_name).unlink(missing_ok=True)
+
+    def _get_page_pixmap(self, content_hash: str, page: int) -> fitz.Pixmap:
+        """
+        Return the page as a pixmap, decoding it from its stored form or
+        rendering it from the saved PDF if it was never rendered or was evicted.
+        The pixmap's samples are handed to the encoder as-is (`pixmap_array`).
+        """
+        decoded_key = (content_hash, page)
+        pixmap = self._decoded_pages.get(decoded_key)
+        if pixmap is not None:
+            return pixmap
+
+        cache_key = ("page", content_hash, page)
+        stored = self._memory.get(cache_key)
+        if stored is None:
+            stored, pixmap = self._render_page(content_hash, page)
+            self._memory.put(cache_key, stored)
+
+        if pixmap is None:
+            with self._render_lock:
+                pixmap = self._page_codec.decode(stored)
+                pixmap.samples_mv  # created once here, under the lock
+        if pixmap is not stored:
+            self._decoded_pages.put(decoded_key, pixmap)
+        return pixmap
+
+    def _render_page(self, content_hash: str, page: int) -> tuple[fitz.Pixmap | bytes, fitz.Pixmap | None]:
+        """
+        (storage form, pixmap if one was rendered) for a page missing from memory.
+        """
+        # Rendered before, by this or another worker
+        rendered = self._store.get_page_render(content_hash, page)
+        if rendered is not None:
+            with self._render_lock:
+                return self._page_codec.compact(rendered), None
+
+        saved_file = self._content_dir / self._load_content(content_hash).file_name
+        if not saved_file.exists():
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Document file is missing.",
+            )
+
+        with self._render_lock:
+            with fitz.open(saved_file) as pdf:
+                zoom = self._render_zoom(pdf[page - 1])
+                pixmap = pdf[page - 1].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+                pixmap.samples_mv
+                rendered = pixmap.tobytes("png")
+                stored = self._page_codec.compact(rendered, pixmap)
+
+        self._store.put_page_render(content_hash, page, rendered)
+        return stored, pixmap
 
-        image_prefix = f"{document_id}_"
-        image_keys = [k for k in self._page_images if k.startswith(image_prefix)]
-        for key in image_keys:
-            self._page_images.pop(key, None)
+    def _render_zoom(self, page: fitz.Page) -> float:
+        # Sized for the loaded processor's input; FIXED_RENDER_ZOOM before it is loaded
+        if self._input_size is None:
+            return FIXED_RENDER_ZOOM
+        return self._render_profile.zoom(page, *self._input_size)
 
-        saved_file = UPLOAD_DIR / f"{document_id}.pdf"
-        if saved_file.exists():
-            saved_file.unlink()
+    def _page_render(self, content_hash: str, page: int) -> bytes:
+        # PNG of a page for the model server, rendered first if needed
+        rendered = self._store.get_page_render(content_hash, page)
+        if rendered is None:
+            self._render_page(content_hash, page)
+            rendered = self._store.get_page_render(content_hash, page)
+        return rendered
 
-    def _run_donut(self, image: Image.Image, question: str) -> tuple[str, float]:
+    def _encode_page(self, content_hash: str, page: int) -> torch.Tensor:
         """
-        Run the Donut model on a page image + question.
+        Return the Donut encoder hidden states for a page.
+        The Swin encoder and image preprocessing run once per page; later
+        questions reuse the cached states until they are evicted.
+        """
+        return self._encode_pages(content_hash, [page])[page]
+
+    def _encode_pages(self, content_hash: str, pages: list[int]) -> dict[int, torch.Tensor]:
+        """Encoder hidden states per page; uncached pages share one encoder pass."""
+        encoded: dict[int, torch.Tensor] = {}
+        missing: list[int] = []
+        for page in pages:
+            encoder_states = self._memory.get(("encoder_states", content_hash, page))
+            if encoder_states is not None:
+                encoded[page] = encoder_states
+            else:
+                missing.append(page)
+        if not missing:
+            return encoded
+
+        # The arrays are views of the pixmaps' buffers — `pixmaps` keeps them alive
+        pixmaps = [self._get_page_pixmap(content_hash, page) for page in missing]
+        batch_states = self._executor.run(self._encode_pixels, [pixmap_array(pixmap) for pixmap in pixmaps])
+        for index, page in enumerate(missing):
+            # Own copy per page so evicting one page frees its memory
+            encoder_states = batch_states[index : index + 1].clone() if len(missing) > 1 else batch_states
+            self._memory.put(("encoder_states", content_hash, page), encoder_states)
+            encoded[page] = encoder_states
+        return encoded
+
+    def _encode_pixels(self, pages: list[np.ndarray]) -> torch.Tensor:
+        # Runs on an inference slot
+        pixel_values = self._preprocessor(pages)
+        return self._backend.encode(pixel_values)
+
+    def _run_donut(self, encoder_states: torch.Tensor, question: str) -> tuple[str, float]:
+        """
+        Run the Donut decoder on encoded page states + question.
+        Concurrent calls are micro-batched into one `generate` by `self._batcher`.
         Returns (answer, confidence).
         """
+        return self._batcher.submit((encoder_states, question))
+
+    def _run_donut_batch(self, items: list[tuple[torch.Tensor, str]]) -> list[tuple[str, float]]:
+        """
+        Run a batch of (encoder states, question) pairs through Donut.
+        Prompts of different lengths share one `generate` call, left-padded
+        (see `_generate`); a backend that cannot pad them gets one call per
+        prompt length instead.
+        """
         # Prepare the prompt — Donut expects a specific format
         task_prompt = "<s_docvqa><s_question>{user_input}</s_question><s_answer>"
-        prompt = task_prompt.replace("{user_input}", question)
-
-        # Encode the image and prompt
-        decoder_input_ids = self._processor.tokenizer(
-            prompt, add_special_tokens=False, return_tensors="pt"
-        ).input_ids
-        pixel_values = self._processor(image, return_tensors="pt").pixel_values
-
-        # Generate the answer — no gradient computation, only inference
-        with torch.no_grad():
-            outputs = self._model.generate(
-                pixel_values,
-                decoder_input_ids=decoder_input_ids,
-                max_length=self._model.decoder.config.max_position_embeddings,
-                pad_token_id=self._processor.tokenizer.pad_token_id,
-                eos_token_id=self._processor.tokenizer.eos_token_id,
-                use_cache=True,
-                bad_words_ids=[[self._processor.tokenizer.unk_token_id]],
-                return_dict_in_generate=True,
-                output_scores=True,
-            )
+        prompt_ids = [
+            # Encode the prompt — the page itself is already encoded
+            self._processor.tokenizer(
+                task_prompt.replace("{user_input}", question),
+                add_special_tokens=False,
+                return_tensors="pt",
+            ).input_ids
+            for _, question in items
+        ]
+
+        if self._backend.pads_prompts:
+            groups = [list(range(len(items)))]
+        else:
+            by_length: dict[int, list[int]] = {}
+            for index, ids in enumerate(prompt_ids):
+                by_length.setdefault(ids.shape[-1], []).append(index)
+            groups = list(by_length.values())
+
+        results: list[tuple[str, float]] = [("", 0.0)] * len(items)
+        for indexes in groups:
+            encoder_states = torch.cat([items[i][0] for i in indexes], dim=0)
+            prompts = [prompt_ids[i] for i in indexes]
+            for index, result in zip(indexes, self._generate(encoder_states, prompts)):
+                results[index] = result
+        return results
 
+    def _generate(
+        self,
+        encoder_states: torch.Tensor,
+        prompts: list[torch.Tensor],
+    ) -> list[tuple[str, float]]:
+        tokenizer = self._processor.tokenizer
+        prompt_length = max(ids.shape[-1] for ids in prompts)
+
+        # Shorter prompts are left-padded so every row's next token is in the
+        # last column; the mask hides the pads and the backend shifts the
+        # positions, so a padded row decodes exactly as it would alone
+        padding = torch.tensor([prompt_length - ids.shape[-1] for ids in prompts])
+        decoder_input_ids = torch.full((len(prompts), prompt_length), tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros_like(decoder_input_ids)
+        for row, ids in enumerate(prompts):
+            decoder_input_ids[row, int(padding[row]):] = ids[0]
+            attention_mask[row, int(padding[row]):] = 1
+        padded = {}
+        if padding.any():
+            padded = {"decoder_attention_mask": attention_mask, "prompt_padding": padding}
+
+        # Answers are short — DONUT_MAX_NEW_TOKENS caps runaway generations,
+        # and the decoder's position limit still applies (to the longest prompt)
+        max_new_tokens = min(
+            settings.donut_max_new_tokens,
+            self._max_positions - prompt_length,
+        )
+        # Confidence is accumulated step by step instead of keeping every step's scores
+        token_confidence = TokenConfidence(tokenizer.eos_token_id)
+
+        # Generate the answer — inference only (mode: DONUT_INFERENCE_MODE)
+        sequences = self._backend.generate(
+            encoder_outputs=BaseModelOutput(last_hidden_state=encoder_states),
+            decoder_input_ids=decoder_input_ids,
+            max_new_tokens=max(1, max_new_tokens),
+            pad_token_id=tokenizer.pad_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            use_cache=True,
+            bad_words_ids=[[tokenizer.unk_token_id]],
+            logits_processor=LogitsProcessorList([token_confidence]),
+            **padded,
+        )
+        confidences = token_confidence.confidences()
+
+        results: list[tuple[str, float]] = []
         # Decode the output tokens → text
-        raw_output = self._processor.batch_decode(outputs.sequences)[0]
-        # Clean the output — remove special tokens
-        raw_output = raw_output.replace(self._processor.tokenizer.eos_token, "")
-        raw_output = raw_output.replace(self._processor.tokenizer.pad_token, "")
+        for row, raw_output in enumerate(self._processor.batch_decode(sequences)):
+            # Clean the output — remove special tokens
+            raw_output = raw_output.replace(tokenizer.eos_token, "")
+            raw_output = raw_output.replace(tokenizer.pad_token, "")
 
-        # Parse the structured output of Donut
-        parsed = self._processor.token2json(raw_output)
+            # Parse the structured output of Donut
+            parsed = self._processor.token2json(raw_output)
 
-        answer = ""
-        confidence = 0.0
+            answer = ""
+            confidence = 0.0
 
-        if isinstance(parsed, dict):
-            answer = parsed.get("answer", str(parsed))
-        else:
-            answer = str(parsed)
+            if isinstance(parsed, dict):
+                answer = parsed.get("answer", str(parsed))
+            else:
+                answer = str(parsed)
+
+            # Mean probability of the chosen tokens, up to and including EOS
+            if row < len(confidences):
+                confidence = round(confidences[row], 4)
+
+            results.append((answer, confidence))
+
+        return results
+
+
+def _new_ingest_pool() -> ProcessPoolExecutor:
+    # spawn — forking a process that already runs torch threads is unsafe
+    return ProcessPoolExecutor(
+        max_workers=max(1, settings.document_ingest_workers),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def _plan_flashcard_pairs(
+    page_count: int,
+    template_count: int,
+    max_attempts: int,
+    cached: Container[tuple[int, int]] = (),
+) -> list[tuple[int, int]]:
+    """
+    (page, template index) pairs that need Donut for a flashcard deck, in order.
+
+    Up to `max_attempts` pairs on evenly spaced pages across the whole
+    document, round by round (first template on every page, then the
+    second, ...) so stopping early still covers the document. Pairs in
+    `cached` already have answers: they are skipped and cost no attempt.
+    """
+    if page_count <= 0 or template_count <= 0 or max_attempts <= 0:
+        return []
+    pages_used = min(page_count, max_attempts)
+    pages = [1 + index * page_count // pages_used for index in range(pages_used)]
+    plan: list[tuple[int, int]] = []
+    for template_index in range(template_count):
+        for page in pages:
+            if (page, template_index) in cached:
+                continue
+            plan.append((page, template_index))
+            if len(plan) >= max_attempts:
+                return plan
+    return plan
+
+
+# Set by `preload_donut_model` in a master process before it forks workers
+_preloaded_donut: tuple[DonutProcessor, VisionEncoderDecoderModel, DonutInferenceBackend | None] | None = None
+
+
+def preload_donut_model() -> None:
+    """
+    Load Donut in this process so forked workers share its weights
+    copy-on-write (see prefork_server.py). Call it on the main thread before
+    forking and before any DocumentService exists: it starts no threads and
+    runs no inference, with torch limited to one thread — an OpenMP pool
+    started before `fork` is unusable in the children. Each worker still
+    warms up (DONUT_WARMUP) on its own inference slots.
+    """
+    global _preloaded_donut
+    torch.set_num_threads(1)
+    processor, model = _load_donut()
+    backend = None if settings.donut_inference_mode == "onnx" else _build_backend(model)
+    _preloaded_donut = (processor, model, backend)
+
+
+def _load_donut() -> tuple[DonutProcessor, VisionEncoderDecoderModel]:
+    # Load the Donut model and processor — takes a while to download initially
+    processor = DonutProcessor.from_pretrained(MODEL_NAME)
+    model = VisionEncoderDecoderModel.from_pretrained(MODEL_NAME)
+    model.eval()  # Evaluation mode — no training, only inference
+    return processor, model
+
+
+def _build_backend(model: VisionEncoderDecoderModel) -> DonutInferenceBackend:
+    # In place: int8 replaces the fp32 Linear layers instead of keeping both
+    return DonutInferenceBackend(
+        model,
+        settings.donut_inference_mode,
+        onnx_dir=_resolve_store_path(settings.document_store_path).parent / "onnx",
+        in_place=True,
+    )
+
+
+def _move_legacy_content_files(content_dir: Path) -> None:
+    # Every worker runs this at startup — another one may move a file first
+    if not LEGACY_UPLOAD_DIR.is_dir():
+        return
+    for legacy_file in LEGACY_UPLOAD_DIR.glob("*.pdf"):
+        if CONTENT_FILE_NAME.fullmatch(legacy_file.name):
+            try:
+                os.replace(legacy_file, content_dir / legacy_file.name)
+            except FileNotFoundError:
+                pass
+
+
+def _resolve_store_path(value: str) -> Path:
+    store_path = Path(value)
+    if not store_path.is_absolute():
+        project_root = Path(__file__).resolve().parent.parent
+        store_path = project_root / store_path
+    return store_path
+
+
+def _remember(cache: dict, key, value, max_entries: int) -> None:
+    # Small insertion-ordered cache — drop the oldest entry once full
+    cache.pop(key, None)
+    cache[key] = value
+    while len(cache) > max_entries:
+        cache.pop(next(iter(cache)))
+
+
+def _artifact_nbytes(value: object) -> int:
+    if isinstance(value, torch.Tensor):
+        return _tensor_nbytes(value)
+    if isinstance(value, fitz.Pixmap):
+        return _pixmap_nbytes(value)
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, DocumentContent):
+        return _content_nbytes(value)
+    return sys.getsizeof(value)
+
+
+def _content_nbytes(content: DocumentContent) -> int:
+    # Iterates the content's caches — only call it under DocumentService._lock
+    # once the content is shared (`_reaccount_content`)
+    size = sys.getsizeof(content.extracted_text)
+    size += sum(sys.getsizeof(text) for text in content.page_texts)
+    if content.page_index is not None:
+        size += content.page_index.nbytes()
+    if content.sentence_index is not None:
+        size += content.sentence_index.nbytes()
+    for question, (answer, _) in content.answers.items():
+        size += sys.getsizeof(question[1]) + sys.getsizeof(answer)
+    for (_, template), answer in content.template_answers.items():
+        size += sys.getsizeof(template) + sys.getsizeof(answer)
+    for (prompt, _), cards in content.flashcards.items():
+        size += sys.getsizeof(prompt)
+        size += sum(sys.getsizeof(question) + sys.getsizeof(answer) for question, answer in cards)
+    return size
+
+
+def _tensor_nbytes(tensor: torch.Tensor) -> int:
+    return tensor.element_size() * tensor.nelement()
 
-        # Calculate the confidence from the generation scores
-        if outputs.scores:
-            probs = torch.stack(outputs.scores, dim=1).softmax(-1)
-            token_probs = probs[0].max(dim=-1).values
-            confidence = round(token_probs.mean().item(), 4)
 
-        return answer, confidence
+def _pixmap_nbytes(pixmap: fitz.Pixmap) -> int:
+    return pixmap.stride * pixmap.height
 
 
 _document_service: DocumentService | None = None
+_document_service_lock = Lock()
 
 
 def get_document_service() -> DocumentService:
-    # Lazy init — model is not loaded until it is used
-    # To avoid slowing down the server startup if it is not used immediately
+    # Cheap to build — the model itself loads on a background thread,
+    # started at app startup (DONUT_PRELOAD) or on first use
     global _document_service
     if _document_service is None:
-        _document_service = DocumentService()
+        with _document_service_lock:
+            if _document_service is None:
+                _document_service = DocumentService(settings.donut_server_socket)
     return _document_service
@@ -1,4 +1,8 @@
+from collections.abc import Iterator
+import json
+
 from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
 
 from models.flashcardmodel import FlashcardDeck, FlashcardItem as FlashcardItemModel
 from schemas.flashcardschema import FlashcardItem, GenerateFlashcardsResponse
@@ -82,6 +86,48 @@ class FlashcardService:
         )
 
 
+    def stream_flashcards(self, document_id: str, prompt: str, count: int = 12) -> StreamingResponse:
+        """
+        SSE variant of `generate_flashcards` — one event per card as soon as
+        it is generated, then a final `done` event.
+
+        Raises (before streaming starts):
+        - 400 if source document has no extracted text
+        """
+        cards = get_document_service().iter_flashcards(
+            document_id=document_id,
+            prompt=prompt,
+            count=count,
+        )
+        return StreamingResponse(
+            self._stream(document_id, cards),
+            media_type="text/event-stream",
+        )
+
+    def _stream(self, document_id: str, cards: Iterator[tuple[str, str]]):
+        sent = 0
+        try:
+            for question_raw, answer_raw in cards:
+                question = str(question_raw).strip()
+                answer = str(answer_raw).strip()
+                if not question or not answer:
+                    continue
+
+                item = FlashcardItem(question=question[:200], answer=answer[:300])
+                yield f"data: {json.dumps({'document_id': document_id, 'flashcard': item.model_dump(), 'done': False})}\n\n"
+                sent += 1
+        except Exception as exc:
+            # Headers are already sent — report the failure as the final event
+            detail = exc.detail if isinstance(exc, HTTPException) else f"Flashcard generation failed: {exc}"
+            yield f"data: {json.dumps({'document_id': document_id, 'error': detail, 'done': True})}\n\n"
+            return
+
+        final = {"document_id": document_id, "count": sent, "model": self._model, "done": True}
+        if not sent:
+            final["error"] = "No valid flashcards were generated."
+        yield f"data: {json.dumps(final)}\n\n"
+
+
 _flashcard_service = FlashcardService()
 
 
@@ -6,6 +6,7 @@ import ollama
 from fastapi import HTTPException, status
 
 from config import settings
+from core.sentence_index import SentenceIndex
 from models.quizmodel import QuizItem as QuizItemModel
 from models.quizmodel import QuizSet
 from schemas.quizschema import GenerateQuizResponse, QuizQuestion
@@ -40,7 +41,8 @@ class QuizService:
 
         questions = self._normalize_items(raw_items=raw_items, count=count)
         if not questions:
-            questions = self._fallback_items(source_text=source_text, count=count)
+            sentence_index = get_document_service().get_sentence_index(document_id)
+            questions = self._fallback_items(sentence_index=sentence_index, count=count)
 
         if not questions:
             raise HTTPException(
@@ -184,17 +186,9 @@ class QuizService:
             shuffle(normalized)
         return normalized[:4]
 
-    def _fallback_items(self, source_text: str, count: int) -> list[QuizItemModel]:
-        cleaned = re.sub(r"\s+", " ", source_text).strip()
-        if not cleaned:
-            return []
-
-        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", cleaned) if s.strip()]
-        candidates = [s for s in sentences if 45 <= len(s) <= 220]
-
+    def _fallback_items(self, sentence_index: SentenceIndex, count: int) -> list[QuizItemModel]:
         fallback: list[QuizItemModel] = []
-        for sentence in candidates:
-            words = re.findall(r"[A-Za-z][A-Za-z0-9\-]{4,}", sentence)
+        for sentence, words in sentence_index.candidates(45, 220):
             if len(words) < 4:
                 continue
 
@@ -203,8 +197,9 @@ class QuizService:
             if prompt == sentence:
                 continue
 
+            # Terms that recur across the document make more plausible distractors
             distractors = []
-            for word in words:
+            for word in sorted(words, key=lambda w: -sentence_index.term_frequencies.get(w.lower(), 0)):
                 value = word.strip()
                 if value.lower() == answer.lower() or value.lower() in {d.lower() for d in distractors}:
                     continue
@@ -12,6 +12,7 @@ import ollama
 
 from config import settings
 from core.firebase_client import get_firestore_client
+from core.upload_spool import SpooledUpload
 from schemas.roomschema import (
 	CreateRoomRequest,
 	JoinRoomByCodeRequest,
@@ -360,15 +361,9 @@ class RoomService:
 				detail=f"File type '{suffix}' is not allowed.",
 			)
 
-		file_bytes = file.file.read()
-		if len(file_bytes) > MAX_ROOM_FILE_BYTES:
-			raise HTTPException(
-				status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-				detail=f"File too large. Max size is {MAX_ROOM_FILE_BYTES // (1024 * 1024)} MB.",
-			)
-
 		stored_name = f"{uuid4()}{suffix}"
-		(ROOM_UPLOADS_DIR / stored_name).write_bytes(file_bytes)
+		with SpooledUpload(file, ROOM_UPLOADS_DIR, MAX_ROOM_FILE_BYTES) as upload:
+			upload.commit(ROOM_UPLOADS_DIR / stored_name)
 
 		file_url = f"/uploads/rooms/{stored_name}"
 		text = message.strip() if message.strip() else f"Shared a file: {filename}"